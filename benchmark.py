@@ -0,0 +1,163 @@
+# benchmark.py
+# Author: Bibek Dahal
+#
+# Builds a tabular tree of about 100k nodes and reports the memory taken
+# by the nodes and the time to build, pickle and lay it out, next to the
+# same measures for an older revision of drafter, by default the last one
+# keeping the properties of the nodes in instance dicts instead of slots.
+# Usage: python benchmark.py [rows] [columns] [--against REVISION]
+
+import argparse
+import json
+import os
+import pickle
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+
+
+# Last revision whose nodes store their properties in instance dicts.
+BASELINE_REVISION = '36a8a07'
+
+# Measures, their label and unit, in the order they are printed.
+MEASURES = [
+    ('build_time', 'build', 's'),
+    ('layout_time', 'layout', 's'),
+    ('pickle_time', 'pickle', 's'),
+    ('pickle_size', 'pickle size', 'B/node'),
+    ('node_memory', 'node memory', 'B/node'),
+    ('box_memory', 'box memory', 'B/node'),
+]
+
+
+def build(rows, columns):
+    from drafter.node import Node
+    from drafter.layouts.row import Row
+
+    return Node(
+        width='100%',
+        children=[
+            Row(
+                width='100%',
+                height=10,
+                children=[
+                    Node(width=f'{100 / columns}%', height='100%')
+                    for _ in range(columns)
+                ],
+            )
+            for _ in range(rows)
+        ],
+    )
+
+
+def measure(rows, columns):
+    """
+    Return the measures of the drafter found on the path as a dict.
+    """
+    from drafter.engine import layout
+
+    count = 1 + rows * (columns + 1)
+
+    # Timings, without tracing allocations.
+    start = time.perf_counter()
+    root = build(rows, columns)
+    build_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    layout(root, 1000, 1000)
+    layout_time = time.perf_counter() - start
+
+    # Trees are pickled to be rendered in other processes.
+    start = time.perf_counter()
+    data = pickle.dumps(root)
+    copy = pickle.loads(data)
+    pickle_time = time.perf_counter() - start
+    if layout(copy, 1000, 1000).h != layout(root, 1000, 1000).h:
+        raise Exception('The unpickled tree is laid out differently')
+    del root, copy
+
+    # Memory.
+    tracemalloc.start()
+    root = build(rows, columns)
+    node_memory = tracemalloc.get_traced_memory()[0]
+    layout(root, 1000, 1000)
+    box_memory = tracemalloc.get_traced_memory()[0] - node_memory
+    tracemalloc.stop()
+
+    return {
+        'nodes': count,
+        'build_time': build_time,
+        'layout_time': layout_time,
+        'pickle_time': pickle_time,
+        'pickle_size': len(data) / count,
+        'node_memory': node_memory / count,
+        'box_memory': box_memory / count,
+    }
+
+
+def measure_revision(revision, rows, columns):
+    """
+    Run this script in a separate process, against the drafter package of
+    a git revision, and return its measures.
+    """
+    root = os.path.dirname(os.path.abspath(__file__))
+    with tempfile.TemporaryDirectory() as directory:
+        archive = subprocess.run(
+            ['git', 'archive', revision, 'drafter'],
+            cwd=root, stdout=subprocess.PIPE, check=True,
+        ).stdout
+        subprocess.run(
+            ['tar', '-x', '-C', directory], input=archive, check=True,
+        )
+        script = os.path.join(directory, 'benchmark.py')
+        with open(__file__, 'rb') as source, open(script, 'wb') as copy:
+            copy.write(source.read())
+
+        output = subprocess.run(
+            [sys.executable, script, str(rows), str(columns), '--json'],
+            cwd=directory, stdout=subprocess.PIPE, check=True,
+        ).stdout
+    return json.loads(output)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='drafter node benchmark')
+    parser.add_argument('rows', type=int, nargs='?', default=10000)
+    parser.add_argument('columns', type=int, nargs='?', default=9)
+    parser.add_argument(
+        '--against', default=BASELINE_REVISION, metavar='REVISION',
+        help='git revision to compare with, or "none"',
+    )
+    parser.add_argument('--json', action='store_true',
+                        help='print the measures of this tree as JSON')
+    args = parser.parse_args()
+
+    current = measure(args.rows, args.columns)
+    if args.json:
+        print(json.dumps(current))
+        return current
+
+    baseline = None
+    if args.against != 'none':
+        baseline = measure_revision(args.against, args.rows, args.columns)
+
+    print(f'nodes: {current["nodes"]}')
+    if baseline is None:
+        for key, label, unit in MEASURES:
+            print(f'{label + ":":14}{current[key]:10.3f} {unit}')
+        return current
+
+    print(f'{"":14}{"current":>10}{args.against:>12}{"ratio":>8}')
+    for key, label, unit in MEASURES:
+        ratio = current[key] / baseline[key] if baseline[key] else 0
+        print(
+            f'{label + ":":14}{current[key]:10.3f}{baseline[key]:12.3f}'
+            f'{ratio:8.2f}  {unit}'
+        )
+    return current
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,18 @@
+# __init__.py
+# Author: Bibek Dahal
+#
+# Importing drafter loads nothing but this module; Pango and the fonts are
+# loaded the first time some text is measured, or ahead of time with
+# `warmup`.
+
+
+def warmup(fonts=()):
+    """
+    Load Pango, the font map and the fontconfig caches now rather than
+    when the first text is measured.
+
+    `fonts` is an optional list of (family, size, weight) to resolve and
+    shape in advance.
+    """
+    from drafter.utils.font import warmup
+    warmup(fonts)
@@ -0,0 +1,150 @@
+# aio.py
+# Author: Bibek Dahal
+
+import asyncio
+import os
+import traceback
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+from drafter.batch import RenderResult, render_job, _result
+from drafter.utils.font import warmup
+
+
+_default_executor = None
+
+
+def default_executor():
+    """
+    Thread pool used by `render_job_async` when no executor is given.
+    """
+    global _default_executor
+    if _default_executor is None:
+        _default_executor = ThreadPoolExecutor(thread_name_prefix='drafter')
+    return _default_executor
+
+
+def discard(future):
+    """
+    Free the output of a render nobody waits for any more, once it is
+    done.
+    """
+    def release(future):
+        if not future.cancelled():
+            _result(0, None, future).release()
+
+    if not future.cancel():
+        future.add_done_callback(release)
+
+
+async def render_job_async(job, executor=None, timeout=None, index=0):
+    """
+    Render a batch Job in `executor` without blocking the event loop and
+    return its RenderResult.
+
+    `executor` can be a thread or process pool; threads are used by
+    default. When the render takes longer than `timeout` seconds, the
+    result carries a timeout error instead. When the awaiting task is
+    cancelled, the job is dropped if it did not start yet, or its output
+    is freed once it completes.
+    """
+    future = (executor or default_executor()).submit(render_job, job)
+    try:
+        await asyncio.wait_for(
+            asyncio.shield(asyncio.wrap_future(future)), timeout
+        )
+    except asyncio.TimeoutError:
+        discard(future)
+        return RenderResult(
+            index, job, error='Timed out after %s seconds' % timeout
+        )
+    except asyncio.CancelledError:
+        discard(future)
+        raise
+    except Exception:
+        return RenderResult(index, job, error=traceback.format_exc())
+    return _result(index, job, future)
+
+
+async def render_many_async(jobs, executor=None, workers=None,
+                            max_in_flight=None, timeout=None, ordered=True,
+                            fonts=()):
+    """
+    Render jobs in a pool and asynchronously yield a RenderResult for
+    each of them, like `drafter.batch.render_many`.
+
+    `jobs` can be an iterable or an async iterable; the next job is only
+    taken once fewer than `max_in_flight` renders are running (the number
+    of workers by default), so a long stream of jobs is not queued all at
+    once. Each render has its own `timeout`.
+
+    Without an `executor`, a pool of `workers` processes is created, with
+    the fonts warmed up as in `render_many`, and shut down at the end.
+    When the caller stops early or is cancelled, the renders in flight
+    are dropped and their outputs freed.
+
+    Outputs returned in shared memory must be released by the caller,
+    either with `RenderResult.getvalue` or `RenderResult.release`.
+    """
+    own_executor = executor is None
+    if own_executor:
+        executor = ProcessPoolExecutor(
+            workers, initializer=warmup, initargs=(fonts,)
+        )
+    max_in_flight = max_in_flight or workers or os.cpu_count() or 1
+
+    in_flight = []
+    try:
+        index = 0
+        async for job in _aiter(jobs):
+            if len(in_flight) >= max_in_flight:
+                for result in await _next_results(in_flight, ordered):
+                    yield result
+            in_flight.append(asyncio.ensure_future(
+                render_job_async(job, executor, timeout, index)
+            ))
+            index += 1
+
+        while in_flight:
+            for result in await _next_results(in_flight, ordered):
+                yield result
+    finally:
+        for task in in_flight:
+            task.cancel()
+        # Let the tasks handle their cancellation and free the outputs of
+        # those that completed meanwhile.
+        for result in await asyncio.gather(
+            *in_flight, return_exceptions=True
+        ):
+            if isinstance(result, RenderResult):
+                result.release()
+        if own_executor:
+            executor.shutdown(wait=False, cancel_futures=True)
+
+
+async def _aiter(jobs):
+    if hasattr(jobs, '__aiter__'):
+        async for job in jobs:
+            yield job
+    else:
+        for job in jobs:
+            yield job
+
+
+async def _next_results(in_flight, ordered):
+    """
+    Wait for the oldest render when `ordered`, otherwise for any, and
+    return the finished results, removing them from `in_flight`.
+    """
+    if ordered:
+        task = in_flight.pop(0)
+        return [await task]
+
+    done, _ = await asyncio.wait(
+        in_flight, return_when=asyncio.FIRST_COMPLETED
+    )
+    results = []
+    for task in list(in_flight):
+        if task in done:
+            in_flight.remove(task)
+            results.append(task.result())
+    return results
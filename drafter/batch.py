@@ -0,0 +1,171 @@
+# batch.py
+# Author: Bibek Dahal
+
+import io
+import traceback
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from multiprocessing.shared_memory import SharedMemory
+
+from drafter.report import PngReport, PdfReport
+from drafter.utils.font import warmup
+
+
+REPORTS = {
+    'png': PngReport,
+    'pdf': PdfReport,
+}
+
+
+class Job:
+    """
+    A page to render with `render_many`.
+
+    Properties:
+    * root_node: Root of the node tree to draw. It must be picklable.
+    * width, height: Size of the page.
+    * format: One of ('png', 'pdf').
+    * filename: Path to write the output to. When None, the output is
+                returned in shared memory instead.
+    """
+    def __init__(self, root_node, width, height, format='png', filename=None):
+        self.root_node = root_node
+        self.width = width
+        self.height = height
+        self.format = format
+        self.filename = filename
+
+
+class RenderResult:
+    """
+    Outcome of one job of `render_many`.
+
+    Properties:
+    * index: Position of the job in the list of jobs.
+    * job: The job itself.
+    * path: Output path when the job had a filename.
+    * size: Size in bytes of the output kept in shared memory.
+    * error: Formatted traceback when the job failed, else None.
+    """
+    def __init__(self, index, job, path=None, shm_name=None, size=0,
+                 error=None):
+        self.index = index
+        self.job = job
+        self.path = path
+        self.size = size
+        self.error = error
+        self._shm_name = shm_name
+        self._shm = None
+
+    @property
+    def ok(self):
+        return self.error is None
+
+    @property
+    def buffer(self):
+        """
+        A memoryview of the output in shared memory, without copying it.
+        It is valid until `release` is called.
+        """
+        if self._shm_name is None:
+            return None
+        if self._shm is None:
+            self._shm = SharedMemory(self._shm_name)
+        return self._shm.buf[:self.size]
+
+    def getvalue(self):
+        """
+        Copy the output out of shared memory and release it.
+        """
+        buffer = self.buffer
+        data = None if buffer is None else bytes(buffer)
+        if buffer is not None:
+            buffer.release()
+        self.release()
+        return data
+
+    def release(self):
+        """
+        Free the shared memory holding the output.
+        """
+        if self._shm_name is None:
+            return
+        if self._shm is None:
+            self._shm = SharedMemory(self._shm_name)
+        self._shm.close()
+        self._shm.unlink()
+        self._shm = None
+        self._shm_name = None
+
+
+def render_job(job):
+    """
+    Render a single job. This runs in the worker processes.
+
+    Never raises: returns (path, shared memory name, size, error).
+    """
+    try:
+        report_class = REPORTS[job.format]
+        if job.filename is not None:
+            report = report_class(job.filename, job.width, job.height)
+            report.draw_page(job.root_node)
+            return job.filename, None, 0, None
+
+        stream = io.BytesIO()
+        report = report_class(stream, job.width, job.height)
+        report.draw_page(job.root_node)
+        data = stream.getbuffer()
+
+        # Shared memory blocks can not be empty.
+        shm = SharedMemory(create=True, size=max(len(data), 1))
+        shm.buf[:len(data)] = data
+        name, size = shm.name, len(data)
+        shm.close()
+        return None, name, size, None
+    except Exception:
+        return None, None, 0, traceback.format_exc()
+
+
+def _result(index, job, future):
+    try:
+        path, shm_name, size, error = future.result()
+    except Exception:
+        # The worker itself failed, for example it was killed.
+        path, shm_name, size, error = None, None, 0, traceback.format_exc()
+    return RenderResult(index, job, path, shm_name, size, error)
+
+
+def render_many(jobs, workers=None, ordered=True, fonts=()):
+    """
+    Render independent jobs over a pool of `workers` processes and yield
+    a RenderResult for each of them.
+
+    Each worker warms up the font index once when it starts; `fonts` is
+    an optional list of (family, size, weight) to resolve in advance.
+
+    When `ordered` is True, results are yielded in the order of the jobs,
+    otherwise as soon as they are completed.
+    A failing job does not affect the others; its result carries the
+    error instead.
+
+    Outputs returned in shared memory must be released by the caller,
+    either with `RenderResult.getvalue` or `RenderResult.release`.
+    """
+    jobs = list(jobs)
+    with ProcessPoolExecutor(
+        workers, initializer=warmup, initargs=(fonts,)
+    ) as executor:
+        futures = {}
+        for index, job in enumerate(jobs):
+            futures[executor.submit(render_job, job)] = index
+        pending = dict(futures)
+
+        try:
+            completed = futures if ordered else as_completed(futures)
+            for future in completed:
+                index = pending.pop(future)
+                yield _result(index, jobs[index], future)
+        finally:
+            # If the caller stopped early, free the outputs nobody will read.
+            for future in pending:
+                if not future.cancel():
+                    _result(pending[future], None, future).release()
@@ -0,0 +1,174 @@
+# cache.py
+# Author: Bibek Dahal
+
+import os
+
+from drafter.utils.hashing import tree_hash, Uncacheable
+from drafter.utils.lru import LRUCache
+
+
+# Changed whenever a change of drafter changes how pages look, so that
+# outputs cached on disk by an older version are not used.
+CACHE_VERSION = 3
+
+# Extension of the cached files, so that the files of a directory which
+# are not outputs are left alone.
+SUFFIX = '.out'
+
+
+def output_key(root_node, *extra):
+    """
+    Key of the output of a node tree, drawn with the settings in `extra`,
+    or None when the tree can not be hashed, e.g. when it has a dynamic
+    canvas. See `drafter.utils.hashing.tree_hash`.
+    """
+    try:
+        return tree_hash(root_node, CACHE_VERSION, *extra)
+    except Uncacheable:
+        return None
+
+
+class OutputCache:
+    """
+    Finished outputs (encoded PNG or PDF data) by the key of the tree
+    they were drawn from, kept in memory and optionally on disk.
+
+    Both levels evict the least recently used outputs once they exceed
+    their size. The disk level can be shared by several processes: each
+    output is a file named after its key, written atomically, and reading
+    it updates its modification time, which is the order of eviction.
+
+    Properties:
+    * directory: Directory of the disk level, or None to only keep the
+                 outputs in memory.
+    * max_memory: Maximum size in bytes of the outputs kept in memory.
+    * max_disk: Maximum size in bytes of the outputs kept on disk.
+    * max_entries: Maximum number of outputs kept in memory.
+
+    Usage:
+        cache = OutputCache('/var/cache/drafter', max_disk=2 ** 30)
+        report = PngReport('out.png', 400, 300, cache=cache)
+        data = report.draw_page(root_node)
+    """
+    def __init__(self, directory=None, max_memory=64 * 1024 * 1024,
+                 max_disk=1024 * 1024 * 1024, max_entries=1024):
+        self.directory = directory
+        self.max_memory = max_memory
+        self.max_disk = max_disk
+        self.memory = LRUCache(max_entries, maxweight=max_memory)
+        self.disk_hits = 0
+        self.disk_misses = 0
+
+        self._disk_size = 0
+        if directory is not None:
+            os.makedirs(directory, exist_ok=True)
+            self.trim()
+
+    def path(self, key):
+        return os.path.join(self.directory, key + SUFFIX)
+
+    def get(self, key):
+        """
+        Return the output of `key`, or None when it is not cached.
+        """
+        data = self.memory.get(key)
+        if data is not None or self.directory is None:
+            return data
+
+        path = self.path(key)
+        try:
+            with open(path, 'rb') as f:
+                data = f.read()
+            os.utime(path)
+        except OSError:
+            self.disk_misses += 1
+            return None
+
+        self.disk_hits += 1
+        self.memory.put(key, data, len(data))
+        return data
+
+    def put(self, key, data):
+        """
+        Keep the output `data` (bytes) of `key`.
+        """
+        self.memory.put(key, data, len(data))
+        if self.directory is None or len(data) > self.max_disk:
+            return
+
+        # Written to a temporary file first, so that other processes never
+        # read a partial output.
+        import tempfile
+        fd, tmp_path = tempfile.mkstemp(dir=self.directory, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                f.write(data)
+            os.replace(tmp_path, self.path(key))
+        except BaseException:
+            try:
+                os.unlink(tmp_path)
+            except OSError:
+                pass
+            raise
+
+        self._disk_size += len(data)
+        if self._disk_size > self.max_disk:
+            self.trim()
+
+    def disk_files(self):
+        """
+        Return (modification time, path, size) of the outputs on disk.
+        """
+        files = []
+        with os.scandir(self.directory) as entries:
+            for entry in entries:
+                if not entry.name.endswith(SUFFIX):
+                    continue
+                try:
+                    stat = entry.stat()
+                except OSError:
+                    continue
+                files.append((stat.st_mtime_ns, entry.path, stat.st_size))
+        return files
+
+    def trim(self):
+        """
+        Remove the least recently used outputs on disk until they fit in
+        `max_disk`. The directory is listed again, so that the outputs
+        written by other processes are counted too.
+        """
+        files = sorted(self.disk_files())
+        size = sum(f[2] for f in files)
+        for _, path, file_size in files:
+            if size <= self.max_disk:
+                break
+            try:
+                os.unlink(path)
+            except OSError:
+                pass
+            size -= file_size
+        self._disk_size = size
+
+    def clear(self):
+        self.memory.clear()
+        if self.directory is not None:
+            for _, path, _ in self.disk_files():
+                try:
+                    os.unlink(path)
+                except OSError:
+                    pass
+        self._disk_size = 0
+        self.disk_hits = 0
+        self.disk_misses = 0
+
+    def stats(self):
+        """
+        Return the counters of this cache as a dict.
+        """
+        return {
+            'memory': self.memory.stats(),
+            'disk_size': self._disk_size,
+            'max_disk': self.max_disk if self.directory is not None else 0,
+            'disk_hits': self.disk_hits,
+            'disk_misses': self.disk_misses,
+        }
@@ -0,0 +1,307 @@
+# display_list.py
+# Author: Bibek Dahal
+
+from drafter.utils.box import intersects
+from drafter.utils.pango import load_pango
+
+
+# Kinds of operations.
+FILL = 0
+STROKE = 1
+TEXT = 2
+CALL = 3
+PUSH = 4
+POP = 5
+
+# Size of the cells of the grid used to find overlapping operations.
+GRID_SIZE = 128
+
+
+def grid_cells(rect):
+    """
+    Cells of the overlap grid touched by a (x0, y0, x1, y1) rectangle.
+    """
+    x0, y0 = int(rect[0] // GRID_SIZE), int(rect[1] // GRID_SIZE)
+    x1, y1 = int(rect[2] // GRID_SIZE), int(rect[3] // GRID_SIZE)
+    return [(x, y) for x in range(x0, x1 + 1) for y in range(y0, y1 + 1)]
+
+
+def contains(a, b):
+    """
+    Whether the (x0, y0, x1, y1) rectangle a contains b.
+    """
+    return a[0] <= b[0] and a[1] <= b[1] and a[2] >= b[2] and a[3] >= b[3]
+
+
+def rounded_rect(ctx, x, y, w, h, r):
+    """
+    Add a rectangle with corners of radius r to the current path.
+    """
+    ctx.move_to(x+r, y)
+    ctx.line_to(x+w-r, y)
+    ctx.curve_to(x+w, y, x+w, y, x+w, y+r)
+    ctx.line_to(x+w, y+h-r)
+    ctx.curve_to(x+w, y+h, x+w, y+h, x+w-r, y+h)
+    ctx.line_to(x+r, y+h)
+    ctx.curve_to(x, y+h, x, y+h, x, y+h-r)
+    ctx.line_to(x, y+r)
+    ctx.curve_to(x, y, x, y, x+r, y)
+    ctx.close_path()
+
+
+class DisplayList:
+    """
+    The drawing operations of a page, collected from the boxes before
+    anything reaches cairo, so that they can be optimized as a whole.
+
+    Nodes add operations with `Node.record`: rectangle fills, rectangle
+    strokes and text are understood by the optimizer, anything else is
+    kept as a call to the node's own drawing code. `optimize` then:
+
+    * drops fills which a later opaque fill covers entirely;
+    * gathers fills of the same color, and strokes of the same style,
+      into a single path, as long as that does not change what is drawn
+      over what;
+    * draws text at its position with `move_to` instead of translating
+      a saved context.
+
+    `play` finally issues the operations, setting the source color and
+    the line style only when they change.
+
+    While a `drafter.trace.Tracer` is active, the list also keeps the
+    nodes each operation comes from, so that the time spent playing it is
+    counted for them.
+
+    Usage:
+        display_list = DisplayList(ctx)
+        box.node.record(display_list, box)
+        display_list.optimize()
+        display_list.play(ctx)
+    """
+    # The active tracer, set by `drafter.trace.Tracer`.
+    tracer = None
+
+    def __init__(self, ctx):
+        # Used by the nodes to create their text layouts.
+        self.ctx = ctx
+        self.ops = []
+        # When tracing, the list of the nodes of each operation and the
+        # node adding operations now.
+        self.owners = [] if self.tracer is not None else None
+        self.owner = None
+        # Coordinate space of the operations added now. Each transform
+        # opens a new one.
+        self._space = 0
+        self._spaces = [0]
+        self._space_count = 1
+
+    def add(self, op):
+        self.ops.append(op)
+        if self.owners is not None:
+            self.owners.append([self.owner])
+
+    def fill(self, x, y, w, h, color):
+        self.add((FILL, self._space, (x, y, x + w, y + h), color))
+
+    def stroke(self, x, y, w, h, radius, color, width, dash, cap):
+        grow = width / 2 + 1
+        self.add((
+            STROKE, self._space,
+            (x - grow, y - grow, x + w + grow, y + h + grow),
+            (x, y, w, h, radius), (color, width, tuple(dash), cap),
+        ))
+
+    def text(self, x, y, layout, color, bounds):
+        self.add((TEXT, self._space, bounds, x, y, layout, color))
+
+    def call(self, function, bounds):
+        """
+        Add a call to function(ctx), made on a saved context.
+        """
+        self.add((CALL, self._space, bounds, function))
+
+    def push(self, matrix):
+        """
+        Transform the following operations until `pop`.
+        """
+        self._space = self._space_count
+        self._space_count += 1
+        self._spaces.append(self._space)
+        self.add((PUSH, self._space, None, matrix))
+
+    def pop(self):
+        self._spaces.pop()
+        self.add((POP, self._space, None))
+        self._space = self._spaces[-1]
+
+    def optimize(self):
+        if self.owners is None:
+            self.ops = self.batch(self.remove_covered(self.ops))
+        else:
+            self.ops, self.owners = self.batch(
+                *self.remove_covered(self.ops, self.owners)
+            )
+
+    @staticmethod
+    def remove_covered(ops, owners=None):
+        """
+        Drop the fills entirely covered by a later opaque fill in the same
+        coordinate space. With `owners`, the list of the nodes of each
+        operation, return the kept operations and their owners.
+        """
+        covers = {}
+        kept = []
+        for i in range(len(ops) - 1, -1, -1):
+            op = ops[i]
+            if op[0] == FILL:
+                rect = op[2]
+                cell = (op[1],) + grid_cells(rect)[0]
+                if any(contains(c, rect) for c in covers.get(cell, ())):
+                    continue
+                if op[3][3] >= 1:
+                    for cell in grid_cells(rect):
+                        covers.setdefault((op[1],) + cell, []).append(rect)
+            kept.append(i)
+        kept.reverse()
+        if owners is None:
+            return [ops[i] for i in kept]
+        return [ops[i] for i in kept], [owners[i] for i in kept]
+
+    @staticmethod
+    def batch(ops, owners=None):
+        """
+        Merge fills of the same color and strokes of the same style into
+        single operations.
+
+        A fill or stroke joins the open batch of its color or style only if
+        it does not overlap anything added since the batch started, so
+        that moving it earlier changes nothing. A translucent one must not
+        overlap the shapes of the batch either, since a path is painted
+        once where its shapes overlap. Calls and transforms close all the
+        batches.
+
+        With `owners`, the list of the nodes of each operation, return the
+        merged operations and the nodes of each of them.
+        """
+        result = []
+        result_owners = []
+        batches = {}
+        grid = {}
+
+        for i, op in enumerate(ops):
+            kind = op[0]
+            if kind in [CALL, PUSH, POP]:
+                batches.clear()
+                grid.clear()
+                result.append((kind,) + op[3:])
+                if owners is not None:
+                    result_owners.append(list(owners[i]))
+                continue
+
+            if kind == FILL:
+                key = (FILL, op[3])
+                shape = op[2]
+                shape = (shape[0], shape[1], shape[2] - shape[0],
+                         shape[3] - shape[1])
+                opaque = op[3][3] >= 1
+            elif kind == STROKE:
+                key = (STROKE, op[4])
+                shape = op[3]
+                opaque = op[4][0][3] >= 1
+            else:
+                key = None
+
+            bounds = op[2]
+            cells = grid_cells(bounds)
+            batch = batches.get(key) if key is not None else None
+            if batch is not None:
+                # The shapes of the batch itself are at its own sequence.
+                first = batch[0] + 1 if opaque else batch[0]
+            if batch is not None and not any(
+                seq >= first and intersects(rect, bounds)
+                for cell in cells for seq, rect in grid.get(cell, ())
+            ):
+                batch[1].append(shape)
+                seq = batch[0]
+                if owners is not None:
+                    result_owners[seq].extend(owners[i])
+            else:
+                seq = len(result)
+                if kind == TEXT:
+                    result.append((TEXT, op[6], op[3], op[4], op[5]))
+                else:
+                    shapes = [shape]
+                    result.append((kind, key[1], shapes))
+                    batches[key] = (seq, shapes)
+                if owners is not None:
+                    result_owners.append(list(owners[i]))
+
+            for cell in cells:
+                grid.setdefault(cell, []).append((seq, bounds))
+
+        if owners is None:
+            return result
+        return result, result_owners
+
+    def play(self, ctx):
+        """
+        Issue the operations on a cairo context.
+        """
+        PangoCairo = None
+        # Current (color, line width, dash, cap), as far as known.
+        state = [None, None, None, None]
+        saved = []
+        tracer = self.tracer if self.owners is not None else None
+
+        for i, op in enumerate(self.ops):
+            if tracer is not None:
+                frame = tracer.begin_op(self.owners[i])
+            kind = op[0]
+            if kind == FILL:
+                for x, y, w, h in op[2]:
+                    ctx.rectangle(x, y, w, h)
+                if state[0] != op[1]:
+                    ctx.set_source_rgba(*op[1])
+                    state[0] = op[1]
+                ctx.fill()
+            elif kind == STROKE:
+                for x, y, w, h, r in op[2]:
+                    if r:
+                        rounded_rect(ctx, x, y, w, h, r)
+                    else:
+                        ctx.rectangle(x, y, w, h)
+                color, width, dash, cap = op[1]
+                if state[0] != color:
+                    ctx.set_source_rgba(*color)
+                if state[1] != width:
+                    ctx.set_line_width(width)
+                if state[2] != dash:
+                    ctx.set_dash(dash)
+                if state[3] != cap:
+                    ctx.set_line_cap(cap)
+                state[:] = op[1]
+                ctx.stroke()
+            elif kind == TEXT:
+                if PangoCairo is None:
+                    PangoCairo = load_pango()[1]
+                if state[0] != op[1]:
+                    ctx.set_source_rgba(*op[1])
+                    state[0] = op[1]
+                ctx.move_to(op[2], op[3])
+                PangoCairo.show_layout(ctx, op[4])
+                ctx.new_path()
+            elif kind == CALL:
+                # The state is restored afterwards.
+                ctx.save()
+                op[1](ctx)
+                ctx.restore()
+                ctx.new_path()
+            elif kind == PUSH:
+                saved.append(list(state))
+                ctx.save()
+                ctx.transform(op[1])
+            elif kind == POP:
+                ctx.restore()
+                state = saved.pop()
+            if tracer is not None:
+                tracer.end_op(frame)
@@ -0,0 +1,191 @@
+# engine.py
+# Author: Bibek Dahal
+
+import cairo
+
+from drafter.display_list import DisplayList
+from drafter.utils.box import union, intersects
+from drafter.utils.pos_size import Position
+
+
+def measuring_context():
+    """
+    Create a tiny cairo context that can be used to measure content
+    without a page-sized surface behind it.
+    """
+    return cairo.Context(cairo.ImageSurface(cairo.FORMAT_ARGB32, 1, 1))
+
+
+def scale_bounds(bounds, box):
+    """
+    Map bounds in the coordinates of the children of `box` to the
+    coordinates of `box`, considering its scaling.
+    """
+    if box.scale is None:
+        return bounds
+    sx, sy = box.scale
+    return (
+        box.cx + (bounds[0] - box.cx) * sx,
+        box.cy + (bounds[1] - box.cy) * sy,
+        box.cx + (bounds[2] - box.cx) * sx,
+        box.cy + (bounds[3] - box.cy) * sy,
+    )
+
+
+def place(box, x, y, abs_x, abs_y):
+    """
+    Convert the relative offsets decided during layout into absolute
+    positions, and compute the bounds of each box.
+
+    (x, y) is the top-left corner of the margin rectangle of this box and
+    (abs_x, abs_y) is the inner origin of the nearest absolute or
+    relative positioned ancestor.
+    """
+    node = box.node
+    box.x = x + box.margin.left
+    box.y = y + box.margin.top
+    box.cx = box.x + box.padding.left
+    box.cy = box.y + box.padding.top
+
+    # Absolute and relative nodes become the reference for absolute
+    # descendants.
+    if node.position in [Position.ABSOLUTE, Position.RELATIVE]:
+        abs_x, abs_y = box.cx, box.cy
+
+    # Half of the border is stroked outside of the box.
+    grow = node.border.width / 2 if node.border is not None else 0
+    bounds = (
+        box.x - grow, box.y - grow,
+        box.x + box.w + grow, box.y + box.h + grow,
+    )
+    # Content overflowing the box.
+    content = node.content_bounds(box)
+    if content is not None:
+        bounds = union(bounds, content)
+
+    for child in box.children:
+        if child.node.position == Position.ABSOLUTE:
+            place(child, abs_x, abs_y, abs_x, abs_y)
+        else:
+            place(child, box.cx + child.ox, box.cy + child.oy, abs_x, abs_y)
+        bounds = union(bounds, scale_bounds(child.bounds, box))
+
+    box.bounds = bounds
+
+
+def layout(root, width, height, ctx=None, previous=None):
+    """
+    Measure the whole tree under `root` for a page of size (width, height)
+    and return the resolved box of the root.
+
+    Nothing is drawn during layout. `ctx` is only used to create text
+    layouts, so that text is measured with the font options of the final
+    surface; when it is None, a small measuring context is used.
+
+    `previous` is the box returned by an earlier layout of the same tree.
+    Boxes of the subtrees that did not change are then reused.
+    """
+    if ctx is None:
+        ctx = measuring_context()
+
+    box = root.layout(ctx, width, height, previous)
+    place(box, 0, 0, 0, 0)
+    return box
+
+
+def collect_changes(new, old, changes):
+    """
+    Compare a new box tree with the previous one, before the new one is
+    placed, and record in `changes` what needs to be checked once it is:
+    (box, old position or None, old bounds or None).
+    """
+    if old is None:
+        changes.append((new, None, None))
+    elif new is old:
+        # Same subtree, which may only have moved.
+        changes.append((new, (old.x, old.y), None))
+    elif (
+        new.node is old.node and
+        new.inputs[2] == old.inputs[2] and
+        (new.w, new.h, new.cw, new.ch, new.scale) ==
+        (old.w, old.h, old.cw, old.ch, old.scale) and
+        len(new.children) == len(old.children)
+    ):
+        # The node itself looks the same, only something below changed.
+        changes.append((new, (old.x, old.y), old.bounds))
+        for n, o in zip(new.children, old.children):
+            collect_changes(n, o, changes)
+    else:
+        changes.append((new, None, old.bounds))
+
+
+def relayout(root, width, height, previous, ctx=None):
+    """
+    Lay out a tree again after some of its nodes changed, reusing the
+    boxes of `previous` where possible.
+
+    Return the new root box and the list of damaged (x0, y0, x1, y1)
+    rectangles, i.e. the areas whose painting may differ.
+    """
+    if ctx is None:
+        ctx = measuring_context()
+
+    box = root.layout(ctx, width, height, previous)
+    changes = []
+    collect_changes(box, previous, changes)
+    place(box, 0, 0, 0, 0)
+
+    damage = []
+    for new, old_position, old_bounds in changes:
+        if old_position is None:
+            # Everything under the box may be different.
+            if old_bounds is not None:
+                damage.append(old_bounds)
+            damage.append(new.bounds)
+            continue
+
+        dx, dy = new.x - old_position[0], new.y - old_position[1]
+        if not dx and not dy:
+            continue
+
+        if old_bounds is None:
+            # The whole unchanged subtree moved.
+            b = new.bounds
+            old_bounds = (b[0] - dx, b[1] - dy, b[2] - dx, b[3] - dy)
+        damage.append(old_bounds)
+        damage.append(new.bounds)
+
+    return box, damage
+
+
+def paint(ctx, box, clip=None):
+    """
+    Paint a box tree, previously resolved by `layout`, on a cairo context.
+
+    When `clip` (x0, y0, x1, y1) is given, boxes entirely outside of it
+    are skipped. The context should already be clipped to it.
+    """
+    if clip is not None and not intersects(box.bounds, clip):
+        return
+
+    # Collect and optimize the drawing operations before issuing them.
+    display_list = DisplayList(ctx)
+    box.node.record(display_list, box, clip)
+    display_list.optimize()
+    display_list.play(ctx)
+
+
+def paint_region(ctx, box, region, scale=1):
+    """
+    Paint the (x, y, w, h) `region` of a page, previously resolved by
+    `layout`, at `scale`, with the top-left corner of the region at the
+    origin of `ctx`. Boxes outside of the region are skipped entirely.
+    """
+    x, y, w, h = region
+    ctx.save()
+    ctx.rectangle(0, 0, w * scale, h * scale)
+    ctx.clip()
+    ctx.scale(scale, scale)
+    ctx.translate(-x, -y)
+    paint(ctx, box, (x, y, x + w, y + h))
+    ctx.restore()
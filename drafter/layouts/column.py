@@ -0,0 +1,71 @@
+# column.py
+# Author: Bibek Dahal
+
+from drafter.node import Node
+from drafter.layouts.flow import in_flow, split_lines
+from drafter.utils.pos_size import (
+    Justify, Align, justify_offsets, align_offset,
+)
+
+
+class Column(Node):
+    """
+    Represents a vertical layout of children.
+
+    Properties:
+    * justify: One of (START, SPACE_BETWEEN, SPACE_AROUND, END)
+               to arrange the children over the height of this node.
+    * align: One of (START, CENTER, END) to arrange the children
+             over the width of this node, or of their line when wrapping.
+    * wrap: True/False indicating whether to continue on a new line
+            to the right when the children do not fit in the height.
+    """
+    __slots__ = ('justify', 'align', 'wrap')
+
+    defaults = {
+        'justify': Justify.START,
+        'align': Align.START,
+        'wrap': False,
+    }
+
+    def lines(self, boxes, h):
+        return split_lines([b.dy for b in boxes], h if self.wrap else 0)
+
+    def children_extent(self, boxes, w, h):
+        """
+        The total width of the lines and the height of the longest line.
+        """
+        boxes = in_flow(boxes)
+        width, height = 0, 0
+        for start, end in self.lines(boxes, h):
+            line = boxes[start:end]
+            width += max((b.dx for b in line), default=0)
+            height = max(height, sum(b.dy for b in line))
+        return width, height
+
+    def arrange(self, box):
+        """
+        The size of each child is known by now.
+        Use that knowledge to calculate the y-spacing required between the
+        children and the x-position of each child.
+        """
+        boxes = in_flow(box.children)
+        x = 0
+        for start, end in self.lines(boxes, box.ch):
+            line = boxes[start:end]
+
+            # Without wrapping, the single line takes the whole width.
+            if self.wrap:
+                line_width = max((b.dx for b in line), default=0)
+            else:
+                line_width = box.cw
+
+            # Position of the first child and spacing between the children.
+            free = box.ch - sum(b.dy for b in line)
+            ry, spacing = justify_offsets(self.justify, free, len(line))
+
+            for b in line:
+                b.oy = ry
+                b.ox = x + align_offset(self.align, line_width - b.dx)
+                ry += b.dy + spacing
+            x += line_width
@@ -0,0 +1,34 @@
+# flow.py
+# Author: Bibek Dahal
+
+from drafter.utils.pos_size import Position
+
+
+def in_flow(boxes):
+    """
+    Return the boxes which take part in the layout of their parent,
+    i.e. all but the absolutely positioned ones.
+    """
+    return [b for b in boxes if b.node.position != Position.ABSOLUTE]
+
+
+def split_lines(sizes, limit):
+    """
+    Split items with the given main-axis sizes into lines no longer than
+    `limit`, in a single pass. Return a list of (start, end) indices.
+
+    A limit of zero means no wrapping. An item longer than the limit
+    gets a line of its own.
+    """
+    if not limit:
+        return [(0, len(sizes))]
+
+    lines = []
+    start, used = 0, 0
+    for i, size in enumerate(sizes):
+        if i > start and used + size > limit:
+            lines.append((start, i))
+            start, used = i, 0
+        used += size
+    lines.append((start, len(sizes)))
+    return lines
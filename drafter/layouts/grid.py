@@ -0,0 +1,271 @@
+# grid.py
+# Author: Bibek Dahal
+
+from drafter.node import Node
+from drafter.utils.pos_size import (
+    Justify, Align, Position, compile_size, resolve_size,
+    justify_offsets, align_offset,
+)
+
+
+# Kinds of tracks.
+FIXED = 0
+AUTO = 1
+FRACTION = 2
+
+
+def compile_track(track):
+    """
+    Parse a track size into a (kind, value) pair.
+    """
+    if track is None:
+        return (AUTO, 0)
+    if isinstance(track, str) and track.endswith('fr'):
+        return (FRACTION, float(track[:-2]))
+    return (FIXED, compile_size(track))
+
+
+def compile_tracks(tracks):
+    return tuple(compile_track(t) for t in tracks)
+
+
+def track(tracks, index):
+    """
+    The compiled track at `index`. Missing ones are auto.
+    """
+    return tracks[index] if index < len(tracks) else (AUTO, 0)
+
+
+def size_tracks(tracks, contents, available, gap):
+    """
+    Resolve the size of each track in a single pass.
+
+    * tracks: Compiled tracks. Missing ones are auto.
+    * contents: Size of the largest child in each track.
+    * available: Size to fill, or zero if unknown.
+    * gap: Spacing between the tracks.
+    """
+    count = len(contents)
+    sizes = list(contents)
+    fractions = 0
+    used = gap * (count - 1) if count else 0
+    for i in range(count):
+        kind, value = track(tracks, i)
+        if kind == FIXED:
+            sizes[i] = resolve_size(available, value)
+        elif kind == FRACTION:
+            fractions += value
+            continue
+        used += sizes[i]
+
+    # Fractions share what is left, but never get smaller than their
+    # content.
+    if fractions and available:
+        remaining = max(available - used, 0)
+        for i in range(count):
+            kind, value = track(tracks, i)
+            if kind == FRACTION:
+                sizes[i] = max(sizes[i], remaining * value / fractions)
+    return sizes
+
+
+class Grid(Node):
+    """
+    Represents a grid of children. Each child takes the next cell, row by
+    row.
+
+    Properties:
+    * columns: List of column sizes. Each one is a fixed value,
+               a percentage of the width of this node, None to fit the
+               widest child of the column or a fraction like '1fr' of the
+               width left by the other columns.
+    * rows: List of row sizes, like columns. Rows beyond the list fit
+            their tallest child.
+    * column_gap: Spacing between the columns.
+    * row_gap: Spacing between the rows.
+    * justify: One of (START, SPACE_BETWEEN, SPACE_AROUND, END)
+               to arrange the columns over the width of this node.
+    * align: One of (START, CENTER, END) to arrange each child
+             over the height of its row.
+
+    A child whose width is a percentage is laid out against the width of
+    its column. In auto and fraction columns, that width is only known
+    once the other children are measured, so such a child is laid out
+    after them and does not widen its column; the same holds for heights
+    and rows.
+    """
+    __slots__ = (
+        'columns', 'rows', 'column_gap', 'row_gap', 'justify', 'align',
+        '_columns', '_rows',
+    )
+
+    defaults = {
+        'columns': [None],
+        'rows': [],
+        'column_gap': 0,
+        'row_gap': 0,
+        'justify': Justify.START,
+        'align': Align.START,
+    }
+
+    compilers = {
+        **Node.compilers,
+        'columns': compile_tracks,
+        'rows': compile_tracks,
+    }
+
+    def column_count(self):
+        return max(len(self._columns), 1)
+
+    def cells(self):
+        """
+        Return the index of the cell of each child, or None for the
+        absolutely positioned children, which take no cell.
+        """
+        cells = []
+        cell = 0
+        for child in self.children:
+            if child.position == Position.ABSOLUTE:
+                cells.append(None)
+            else:
+                cells.append(cell)
+                cell += 1
+        return cells
+
+    def child_frame(self, index, w, h):
+        return self.cell_frame(self.cells()[index], w, h)
+
+    def cell_frame(self, cell, w, h):
+        """
+        Children of fixed or percentage tracks are laid out against the
+        size of their cell.
+        """
+        if cell is None:
+            return w, h
+        count = self.column_count()
+        column, row = cell % count, cell // count
+
+        kind, value = track(self._columns, column)
+        if kind == FIXED:
+            w = resolve_size(w, value)
+        kind, value = track(self._rows, row)
+        if kind == FIXED:
+            h = resolve_size(h, value)
+        return w, h
+
+    def sized_by_track(self, child, cell, w, h):
+        """
+        Whether the width and whether the height of `child`, in `cell`,
+        are a percentage of an auto or fraction track, so that they come
+        from the track rather than the other way round. When the inner
+        size (w, h) of this node is unknown (zero), they are measured like
+        any other child instead.
+        """
+        if cell is None:
+            return False, False
+        count = self.column_count()
+        return (
+            bool(w and child._width[1]) and
+            track(self._columns, cell % count)[0] != FIXED,
+            bool(h and child._height[1]) and
+            track(self._rows, cell // count)[0] != FIXED,
+        )
+
+    def layout_children(self, ctx, w, h, previous, growing=False):
+        """
+        Lay out each child against the size of its cell. The children
+        sized by their tracks are laid out after the others.
+        """
+        count = self.column_count()
+        cells = self.cells()
+        deferred = {
+            i for i, (c, cell) in enumerate(zip(self.children, cells))
+            if any(self.sized_by_track(c, cell, w, h))
+        }
+
+        old_boxes = [
+            previous[i] if growing else self.previous_child(previous, i, c)
+            for i, c in enumerate(self.children)
+        ]
+        boxes = []
+        for i, (c, b) in enumerate(zip(self.children, old_boxes)):
+            if i in deferred:
+                boxes.append(None)
+            elif growing and not c.depends_on_parent():
+                boxes.append(b)
+            else:
+                boxes.append(
+                    c.layout(ctx, *self.cell_frame(cells[i], w, h), b)
+                )
+        if not deferred:
+            return boxes
+
+        widths, heights = self.track_sizes(boxes, w, h)
+        for i in sorted(deferred):
+            boxes[i] = self.children[i].layout(
+                ctx, widths[cells[i] % count], heights[cells[i] // count],
+                old_boxes[i],
+            )
+        return boxes
+
+    def track_sizes(self, boxes, w, h):
+        """
+        Return the sizes of the columns and of the rows. Boxes of the
+        children sized by their tracks are not counted, and may be None.
+        """
+        count = self.column_count()
+        cells = self.cells()
+        used = sum(cell is not None for cell in cells)
+        rows = (used + count - 1) // count
+        widths = [0] * count
+        heights = [0] * rows
+        for b, child, cell in zip(boxes, self.children, cells):
+            if b is None or cell is None:
+                continue
+            column, row = cell % count, cell // count
+            by_column, by_row = self.sized_by_track(child, cell, w, h)
+            if not by_column:
+                widths[column] = max(widths[column], b.dx)
+            if not by_row:
+                heights[row] = max(heights[row], b.dy)
+
+        return (
+            size_tracks(self._columns, widths, w, self.column_gap),
+            size_tracks(self._rows, heights, h, self.row_gap),
+        )
+
+    def children_extent(self, boxes, w, h):
+        widths, heights = self.track_sizes(boxes, w, h)
+        return (
+            sum(widths) + self.column_gap * max(len(widths) - 1, 0),
+            sum(heights) + self.row_gap * max(len(heights) - 1, 0),
+        )
+
+    def arrange(self, box):
+        """
+        Size the tracks for the final size of this node and place each
+        child in its cell.
+        """
+        widths, heights = self.track_sizes(box.children, box.cw, box.ch)
+
+        # Distribute the free width between the columns.
+        free = box.cw - sum(widths) - self.column_gap * (len(widths) - 1)
+        x, spacing = justify_offsets(self.justify, free, len(widths))
+        xs = []
+        for width in widths:
+            xs.append(x)
+            x += width + self.column_gap + spacing
+
+        ys = []
+        y = 0
+        for height in heights:
+            ys.append(y)
+            y += height + self.row_gap
+
+        count = len(widths)
+        for b, cell in zip(box.children, self.cells()):
+            if cell is None:
+                continue
+            column, row = cell % count, cell // count
+            b.ox = xs[column]
+            b.oy = ys[row] + align_offset(self.align, heights[row] - b.dy)
@@ -2,7 +2,10 @@
 # Author: Bibek Dahal
 
 from drafter.node import Node
-from drafter.utils.pos_size import Justify, Align
+from drafter.layouts.flow import in_flow, split_lines
+from drafter.utils.pos_size import (
+    Justify, Align, justify_offsets, align_offset,
+)
 
 
 class Row(Node):
@@ -13,83 +16,56 @@ class Row(Node):
     * justify: One of (START, SPACE_BETWEEN, SPACE_AROUND, END)
                to arrange the children over the width of this node.
     * align: One of (START, CENTER, END) to arrange the children
-             over the height of this node.
+             over the height of this node, or of their line when wrapping.
+    * wrap: True/False indicating whether to continue on a new line
+            below when the children do not fit in the width.
     """
-    justify = Justify.START
-    align = Align.START
+    __slots__ = ('justify', 'align', 'wrap')
 
-    # We need at least 2 drawing passes for this node to work.
-    min_draw_pass = 2
+    defaults = {
+        'justify': Justify.START,
+        'align': Align.START,
+        'wrap': False,
+    }
 
-    def pre_draw(self, context, draw_pass, dirty):
-        """
-        When we are in the second drawing pass, we know the size of each child.
-        Use that knowledge to calculate the x-spacing required between the
-        children.
-        """
-        if draw_pass == 1:
-            self.children_heights = []
-            return
-
-        me = self.last_pass_context['parent']
-        total_width = me['w']
+    def lines(self, boxes, w):
+        return split_lines([b.dx for b in boxes], w if self.wrap else 0)
 
-        if self.justify == Justify.SPACE_BETWEEN:
-            divisor = len(self.children) - 1
-            self.spacing = (total_width - self.children_width) / divisor
-        elif self.justify == Justify.SPACE_AROUND:
-            divisor = len(self.children) + 1
-            self.spacing = (total_width - self.children_width) / divisor
-        elif self.justify == Justify.END:
-            self.spacing = total_width - self.children_width
-
-    def pre_update(self, context, child_context, draw_pass):
+    def children_extent(self, boxes, w, h):
         """
-        pre_update is called before drawing any child.
-        In the second drawing pass,
-        the relative x position of the first child should be updated for
-        justify = SPACE_AROUND and justify = END.
+        The width of the longest line and the total height of the lines.
         """
-        if draw_pass == 1:
-            return
-
-        me = child_context['parent']
-        if self.justify == Justify.SPACE_AROUND:
-            me['rx'] += self.spacing
-
-        elif self.justify == Justify.END:
-            me['rx'] += self.spacing
-
-        self.child = 0
-        if self.align == Align.CENTER:
-            me['ry'] = (me['h'] - self.children_heights[self.child]) / 2
-        elif self.align == Align.END:
-            me['ry'] = me['h'] - self.children_heights[self.child]
-
-    def update(self, context, child_context, child_response, draw_pass):
+        boxes = in_flow(boxes)
+        width, height = 0, 0
+        for start, end in self.lines(boxes, w):
+            line = boxes[start:end]
+            width = max(width, sum(b.dx for b in line))
+            height += max((b.dy for b in line), default=0)
+        return width, height
+
+    def arrange(self, box):
         """
-        update is called after drawing each child.
-        In the second drawing pass,
-        the relative x position of the next child should be updated for
-        justify = SPACE_BETWEEN and justify = SPACE_AROUND using `spacing`
-        and the rest without any spacing.
+        The size of each child is known by now.
+        Use that knowledge to calculate the x-spacing required between the
+        children and the y-position of each child.
         """
-
-        me = child_context['parent']
-        if draw_pass == 1:
-            me['rx'] += child_response['dx']
-            self.children_heights.append(child_response['dy'])
-            return
-
-        if self.justify in [Justify.SPACE_BETWEEN, Justify.SPACE_AROUND]:
-            me['rx'] += child_response['dx'] + self.spacing
-        else:
-            me['rx'] += child_response['dx']
-
-        self.child += 1
-        if self.child == len(self.children):
-            return
-        if self.align == Align.CENTER:
-            me['ry'] = (me['h'] - self.children_heights[self.child]) / 2
-        elif self.align == Align.END:
-            me['ry'] = me['h'] - self.children_heights[self.child]
+        boxes = in_flow(box.children)
+        y = 0
+        for start, end in self.lines(boxes, box.cw):
+            line = boxes[start:end]
+
+            # Without wrapping, the single line takes the whole height.
+            if self.wrap:
+                line_height = max((b.dy for b in line), default=0)
+            else:
+                line_height = box.ch
+
+            # Position of the first child and spacing between the children.
+            free = box.cw - sum(b.dx for b in line)
+            rx, spacing = justify_offsets(self.justify, free, len(line))
+
+            for b in line:
+                b.ox = rx
+                b.oy = y + align_offset(self.align, line_height - b.dy)
+                rx += b.dx + spacing
+            y += line_height
@@ -0,0 +1,112 @@
+# live.py
+# Author: Bibek Dahal
+
+import math
+
+import cairo
+
+from drafter.engine import layout, relayout, paint
+from drafter.utils.box import union, intersects
+
+
+class LiveImage:
+    """
+    A raster page kept in memory and updated incrementally, for live
+    previews and dashboards.
+
+    After changing properties of some nodes of the tree, call `update`:
+    only the changed subtrees and their ancestors are laid out again, and
+    only the damaged area of the retained surface is repainted.
+
+    Properties:
+    * surface: The retained ARGB32 ImageSurface.
+    * box: Root box of the last layout.
+    """
+
+    # Above this many damaged rectangles, repaint their union at once.
+    max_damage_rects = 8
+
+    def __init__(self, root_node, width, height):
+        self.root_node = root_node
+        self.width = width
+        self.height = height
+        self.surface = cairo.ImageSurface(cairo.FORMAT_ARGB32, width, height)
+        self.measure_ctx = cairo.Context(
+            cairo.ImageSurface(cairo.FORMAT_ARGB32, 1, 1)
+        )
+        self.box = None
+
+    def clamp(self, rect):
+        """
+        Round a damaged rectangle out to whole pixels inside the surface.
+        Return None if nothing is left.
+        """
+        x0 = max(math.floor(rect[0]) - 1, 0)
+        y0 = max(math.floor(rect[1]) - 1, 0)
+        x1 = min(math.ceil(rect[2]) + 1, self.width)
+        y1 = min(math.ceil(rect[3]) + 1, self.height)
+        if x0 >= x1 or y0 >= y1:
+            return None
+        return (x0, y0, x1, y1)
+
+    def merge(self, rects):
+        """
+        Merge overlapping damaged rectangles.
+        """
+        merged = []
+        for rect in rects:
+            for i, other in enumerate(merged):
+                if intersects(rect, other):
+                    merged[i] = union(rect, other)
+                    break
+            else:
+                merged.append(rect)
+
+        if len(merged) > self.max_damage_rects:
+            result = merged[0]
+            for rect in merged[1:]:
+                result = union(result, rect)
+            merged = [result]
+        return merged
+
+    def repaint(self, rect):
+        ctx = cairo.Context(self.surface)
+        ctx.rectangle(rect[0], rect[1], rect[2] - rect[0], rect[3] - rect[1])
+        ctx.clip()
+
+        # Clear what was painted before.
+        ctx.set_operator(cairo.OPERATOR_CLEAR)
+        ctx.paint()
+        ctx.set_operator(cairo.OPERATOR_OVER)
+
+        paint(ctx, self.box, rect)
+
+    def update(self):
+        """
+        Bring the surface up to date with the node tree and return the list
+        of repainted (x0, y0, x1, y1) rectangles.
+        """
+        if self.box is None:
+            self.box = layout(
+                self.root_node, self.width, self.height, self.measure_ctx
+            )
+            damage = [(0, 0, self.width, self.height)]
+        else:
+            self.box, damage = relayout(
+                self.root_node, self.width, self.height, self.box,
+                self.measure_ctx,
+            )
+
+        rects = [r for r in map(self.clamp, damage) if r is not None]
+        rects = self.merge(rects)
+        for rect in rects:
+            self.repaint(rect)
+
+        self.surface.flush()
+        return rects
+
+    def write_to_png(self, target):
+        """
+        Write the current state of the surface to a filename or stream.
+        """
+        self.surface.write_to_png(target)
@@ -1,9 +1,15 @@
 # node.py
 # Author: Bibek Dahal
 
-from drafter.utils.rect import default_rect
-from drafter.utils.pos_size import Position, calc_size, calc_rect_size
-from drafter.utils.color import parse_color
+from types import MemberDescriptorType
+
+from drafter.utils.rect import Rect, default_rect
+from drafter.utils.pos_size import (
+    Position, compile_size, resolve_size, compile_rect, resolve_rect,
+)
+from drafter.utils.color import compile_color
+from drafter.utils.box import Box, intersects
+from drafter.utils.field import Field
 
 
 class Node:
@@ -22,6 +28,10 @@ class Node:
     (strokes around the perimeter of the rectangular area) and padding
     (spacing between the perimeter and the drawn content).
 
+    Drafting happens in two phases. `layout` measures the node and its
+    children into a tree of Box objects without drawing anything, and
+    `paint` then draws those boxes once. See `drafter.engine`.
+
     Default properties:
     -------------------
     children: Children of these node.
@@ -36,229 +46,444 @@ class Node:
     position: One of (STATIC, ABSOLUTE, RELATIVE), similar to CSS position
               property.
     """
-    children = []
-    background = None
-    width, height = None, None
-    margin = default_rect
-    padding = default_rect
-    border = None
-    position = Position.STATIC
-    tag = 'N/A'
-
-    # Default minimum number of drawing passes is 1.
-    min_draw_pass = 1
+    __slots__ = (
+        'children', 'background', 'width', 'height', 'margin', 'padding',
+        'border', 'position', 'tag',
+        '_version', '_width', '_height', '_margin', '_padding', '_background',
+        '__weakref__',
+    )
+
+    # Nodes store their properties in slots rather than in a per-instance
+    # dict. Subclasses list the default values of their own slots here, or
+    # simply override a default with a class attribute.
+    defaults = {
+        'children': (),
+        'background': None,
+        'width': None,
+        'height': None,
+        'margin': default_rect,
+        'padding': default_rect,
+        'border': None,
+        'position': Position.STATIC,
+        'tag': 'N/A',
+    }
+
+    # Style properties which are parsed once, when they are set, into
+    # numeric values stored as `_<property>`.
+    compilers = {
+        'width': compile_size,
+        'height': compile_size,
+        'margin': compile_rect,
+        'padding': compile_rect,
+        'background': compile_color,
+    }
+
+    # Public properties which are set by the layout rather than by the
+    # user, and so are not part of what a tree draws.
+    layout_outputs = ()
 
     def __init__(self, **kwargs):
         """
         On constructing any Node, the default properties can be overriden using
         kwargs.
         """
+        for key, value in self.initial_values():
+            object.__setattr__(self, key, value)
+
         for key, value in kwargs.items():
             setattr(self, key, value)
 
+    @classmethod
+    def initial_values(cls):
+        """
+        Return the (slot, value) pairs every instance of this class starts
+        with: the defaults which are not overridden by a class attribute,
+        the compiled form of the default styles and a version of zero.
+        Computed once per class.
+        """
+        values = cls.__dict__.get('_initial_values')
+        if values is not None:
+            return values
+
+        defaults = {}
+        for klass in reversed(cls.__mro__):
+            defaults.update(klass.__dict__.get('defaults', {}))
+
+        values = []
+        for key, value in defaults.items():
+            # A class attribute of a subclass takes over the slot.
+            if isinstance(getattr(cls, key), MemberDescriptorType):
+                values.append((key, value))
+            else:
+                value = getattr(cls, key)
+            if key in cls.compilers:
+                values.append(('_' + key, cls.compilers[key](value)))
+        # Incremented whenever a property is set, so that layout can tell
+        # which nodes changed since the last time.
+        values.append(('_version', 0))
+
+        cls._initial_values = values
+        return values
+
+    def __setattr__(self, key, value):
+        """
+        Compile style properties whenever they are set and mark this node
+        as changed.
+        Note that modifying a Rect in place is not noticed; assign a new
+        Rect instead. Children added to or removed from the list are
+        noticed by the layout.
+        """
+        object.__setattr__(self, key, value)
+        object.__setattr__(self, '_version', self._version + 1)
+        if key in self.compilers:
+            self.compile_property(key)
+
+    def __getstate__(self):
+        """
+        Only the properties are pickled, e.g. to send a tree to another
+        process. What is compiled or cached from them, such as the
+        recording of a canvas, is rebuilt after unpickling. Attributes of
+        subclasses without slots are pickled as they are.
+        """
+        state = {
+            key: getattr(self, key)
+            for key, _ in self.initial_values() if not key.startswith('_')
+        }
+        state.update(getattr(self, '__dict__', {}))
+        return state
+
+    def __setstate__(self, state):
+        # The slots are empty here, so `__setattr__` can not be used.
+        for key, value in self.initial_values():
+            object.__setattr__(self, key, value)
+        for key, value in state.items():
+            object.__setattr__(self, key, value)
+            if key in self.compilers:
+                self.compile_property(key)
+
+    def compile_property(self, key):
+        """
+        Parse the style property `key` into its numeric form.
+        Placeholders of templates are left for when they are bound.
+        """
+        value = getattr(self, key)
+        if isinstance(value, Field):
+            return
+        object.__setattr__(self, '_' + key, self.compilers[key](value))
+
+    def cache_key(self):
+        """
+        Return a value identifying what the node draws which its
+        properties do not hold, e.g. the content of a file it reads, or
+        None. Part of the key of cached outputs, see `drafter.cache`.
+        """
+        return None
+
     def draw_border_and_background(self, ctx, x, y, w, h):
         """
         Draw a border and background for this node.
-        This function also returns the position and size of the inner
-        rectangle after padding, where the actual content goes.
         """
 
-        # Calculate the x, y, w, h of the inner rectangle after padding.
-        xx = x + self.padding.left
-        yy = y + self.padding.top
-        ww = w - self.padding.left - self.padding.right
-        hh = h - self.padding.top - self.padding.bottom
-
         # Draw the background.
-        if self.background is not None:
+        if self._background is not None:
             ctx.rectangle(x, y, w, h)
-            ctx.set_source_rgba(*parse_color(self.background))
+            ctx.set_source_rgba(*self._background)
             ctx.fill()
 
         # Draw the border.
         if self.border is not None:
             self.border.draw(ctx, x, y, w, h)
 
-        return xx, yy, ww, hh
+    def measure_content(self, ctx, w, h):
+        """
+        Return the size of the content for the given available size.
+        A width or height of zero means it is unknown and should be
+        decided by the content.
+
+        By default, the content takes no space of its own.
+        """
+        return w, h
+
+    def layout_content(self, ctx, w, h):
+        """
+        Return the size of the content, as `measure_content` does, and what
+        painting it needs from the measurement, which is kept in the box as
+        `content`. Nodes should keep such results in the box rather than on
+        themselves, since a node can be laid out for several sizes.
+
+        By default, nothing is kept.
+        """
+        w, h = self.measure_content(ctx, w, h)
+        return w, h, None
+
+    def content_bounds(self, box):
+        """
+        Return the (x0, y0, x1, y1) rectangle covering what the content of
+        this node paints at its placed box, when it may go beyond the box,
+        e.g. text taller than a fixed height. Used so that the parts
+        outside of the box are not culled.
+
+        By default, None: the content stays inside the box.
+        """
+        return None
 
     def draw_content(self, ctx, x, y, w, h):
         """
         By default, draws nothing.
         """
+        pass
+
+    def depends_on_parent(self):
+        """
+        Whether the size of this node changes with the size of its parent.
+        """
+        return bool(
+            self._width[1] or self._height[1] or
+            not isinstance(self._margin, Rect) or
+            not isinstance(self._padding, Rect)
+        )
+
+    def child_frame(self, index, w, h):
+        """
+        Return the parent size the child at `index` is laid out against,
+        given the inner size of this node. By default, it is the inner size.
+        """
         return w, h
 
-    def pre_update(self, context, child_context, draw_pass):
+    def children_extent(self, boxes, w, h):
         """
-        Called before drawing any child.
+        Return the total size taken by the children, given the inner size
+        of this node (zero when unknown).
+        By default, children flow horizontally one after another.
         """
-        pass
+        return (
+            sum(b.dx for b in boxes),
+            max((b.dy for b in boxes), default=0),
+        )
 
-    def update(self, context, child_context, child_response, draw_pass):
+    def arrange(self, box):
         """
-        Called after drawing each child.
-        By default, update the relative position to draw the next child.
+        Called once the size of this node and of all its children are
+        known, to set the offset of each child relative to the inner
+        rectangle of this node.
+        By default, place the children one after another horizontally.
         """
-        me = child_context['parent']
-        me['rx'] += child_response['dx']
+        rx = 0
+        for b in box.children:
+            b.ox, b.oy = rx, 0
+            rx += b.dx
 
-    def pre_draw(self, context, draw_pass, dirty):
+    def layout(self, ctx, parent_w, parent_h, previous=None):
         """
-        Called before drawing any content.
+        Measure this node and its children for the given parent size and
+        return the resolved Box.
+
+        Each node is measured once. Sizes that are unknown (None) are
+        taken from the content and the children. Only when that makes the
+        inner size differ from the first estimate, the children whose size
+        is a percentage of this node are measured again.
+
+        `previous` is the box of this node from an earlier layout, if any.
+        When neither this node nor its parent size changed since then, its
+        measurement is reused, and when the same holds for the whole
+        subtree, `previous` itself is returned.
+
+        Positions are relative at this point; see `drafter.engine.place`.
         """
-        pass
+        inputs = (parent_w, parent_h, self._version)
+        if previous is not None and previous.node is not self:
+            previous = None
+        clean = previous is not None and previous.inputs == inputs
+
+        if clean:
+            margin, padding = previous.margin, previous.padding
+            w, h, cw, ch = previous.measured
+            content = previous.content
+        else:
+            margin = resolve_rect(parent_w, parent_h, self._margin)
+            padding = resolve_rect(parent_w, parent_h, self._padding)
+
+            w = resolve_size(parent_w, self._width)
+            h = resolve_size(parent_h, self._height)
+
+            # Size available for the content and the children.
+            # Zero means unknown.
+            cw = max(w - padding.left - padding.right, 0) if w else 0
+            ch = max(h - padding.top - padding.bottom, 0) if h else 0
+            mw, mh, content = self.layout_content(ctx, cw, ch)
+            if not w:
+                cw = mw
+            if not h:
+                ch = mh
+
+        old_children = previous.children if previous is not None else []
+        children = self.layout_children(ctx, cw, ch, old_children)
+
+        # Nothing changed in the whole subtree.
+        if clean and len(children) == len(old_children) and all(
+            a is b for a, b in zip(children, old_children)
+        ):
+            return previous
+
+        ew, eh = self.children_extent(children, cw, ch)
+
+        # Unknown sizes also grow to fit the children.
+        fw = cw if w else max(cw, ew)
+        fh = ch if h else max(ch, eh)
+        if (fw, fh) != (cw, ch):
+            children = self.layout_children(ctx, fw, fh, children, True)
+
+        box = Box(self, margin, padding)
+        box.inputs = inputs
+        box.measured = (w, h, cw, ch)
+        box.content = content
+        box.cw, box.ch = fw, fh
+        box.w = w if w else fw + padding.left + padding.right
+        box.h = h if h else fh + padding.top + padding.bottom
+        box.children = children
+        self.arrange(box)
+        return box
+
+    def layout_children(self, ctx, w, h, previous, growing=False):
+        """
+        Lay out the children against the inner size (w, h) of this node
+        and return their boxes. `previous` are boxes of the children from
+        an earlier layout.
 
-    def post_draw(self, context, draw_pass, dirty):
+        When `growing`, `previous` are the boxes just laid out for a
+        smaller size, which grew to fit them, and only the children
+        depending on the size of this node are laid out again.
         """
-        Called after drawing all the content and the children.
+        if growing:
+            return [
+                c.layout(ctx, *self.child_frame(i, w, h), b)
+                if c.depends_on_parent() else b
+                for i, (c, b) in enumerate(zip(self.children, previous))
+            ]
+        return [
+            c.layout(
+                ctx, *self.child_frame(i, w, h),
+                self.previous_child(previous, i, c),
+            )
+            for i, c in enumerate(self.children)
+        ]
+
+    @staticmethod
+    def previous_child(boxes, index, child):
         """
-        pass
+        Return the earlier box of `child` if it was at the same index.
+        """
+        if index < len(boxes) and boxes[index].node is child:
+            return boxes[index]
+        return None
 
-    def draw(self, context, draw_pass=1, force_dirty=False):
+    def paint_children(self, ctx, box, clip=None):
         """
-        Drawing can occur in several passes to establish the final layout.
+        Paint the boxes of the children.
+        When `clip` (x0, y0, x1, y1) is given, children entirely outside of
+        it are skipped.
+        """
+        for child in box.children:
+            if clip is None or intersects(child.bounds, clip):
+                child.node.paint(ctx, child, clip)
 
-        Following are the cases when multiple drawing passes can occur:
+    def paint(self, ctx, box, clip=None):
+        """
+        Paint this node at its resolved box: first the border and
+        background, then the content and finally the children.
+        """
+        self.draw_border_and_background(ctx, box.x, box.y, box.w, box.h)
+        self.draw_content(ctx, box.cx, box.cy, box.cw, box.ch)
+        self.paint_children(ctx, box, clip)
 
-        - This is the first pass but the width or height of this node
-          is unknown. In such a case, we render all the content and the
-          children and save their total size for the next pass.
-          This size is necessary for drawing background and border.
-          It may also be necessary for this node's parent.
+    def paints_directly(self, name):
+        """
+        Whether the painting method `name` is overridden by a subclass
+        which does not override the matching recording method too, so that
+        display lists must call it as it is.
+        """
+        key = (type(self), name)
+        direct = _paints_directly.get(key)
+        if direct is None:
+            direct = False
+            for klass in type(self).__mro__:
+                if RECORD_METHODS[name] in klass.__dict__:
+                    break
+                if name in klass.__dict__:
+                    direct = True
+                    break
+            _paints_directly[key] = direct
+        return direct
+
+    def record_border_and_background(self, display_list, x, y, w, h):
+        """
+        Add the background and border of this node to a display list.
+        """
+        if self.paints_directly('draw_border_and_background'):
+            display_list.call(
+                lambda ctx: self.draw_border_and_background(ctx, x, y, w, h),
+                (x, y, x + w, y + h),
+            )
+            return
 
-         - This node actually requires two passes. For example, to justify
-           content between children nodes in the 'Row' node or to
-           fit the content in the 'AutoScale' node. Both of them
-           require the size of the children, so the children need to be drawn
-           in the first pass to figure out the size.
-         """
+        if self._background is not None:
+            display_list.fill(x, y, w, h, self._background)
+        if self.border is not None:
+            self.border.record(display_list, x, y, w, h)
 
-        # We are drawing either with respect to the immediate parent
-        # or with respect to the nearest absolute parent.
-        parent = context['parent']
-        abs_parent = context['abs_parent']
+    def record_content(self, display_list, box):
+        """
+        Add the content of this node to a display list. By default, it is
+        a call to `draw_content`, if the node draws any content.
+        """
+        if type(self).draw_content is not Node.draw_content:
+            display_list.call(
+                lambda ctx: self.draw_content(
+                    ctx, box.cx, box.cy, box.cw, box.ch
+                ),
+                box.bounds,
+            )
 
-        # Based on `position` property, set where to draw this node.
-        if self.position == Position.ABSOLUTE:
-            pos_x = abs_parent['x']
-            pos_y = abs_parent['y']
-        else:
-            pos_x = parent['x'] + parent['rx']
-            pos_y = parent['y'] + parent['ry']
-
-        # Make sure to consider margin when drawing this node.
-        margin = calc_rect_size(parent['w'], parent['h'], self.margin)
-        x = pos_x + margin.left
-        y = pos_y + margin.top
-
-        if draw_pass > 1:
-            # For subsequent passes after the first pass,
-            # we will consider the final width and height from the last pass.
-            w = self.last_pass_context['parent']['w']
-            h = self.last_pass_context['parent']['h']
-        else:
-            # Otherwise, simply set width and height to whatever the user
-            # has chosen.
-            w = calc_size(parent['w'], self.width)
-            h = calc_size(parent['h'], self.height)
-
-        # If this is not the first pass, we do not want to draw in the
-        # TRUE surface but rather in the DIRTY surface. Grab cairo contexts for
-        # both the surfaces.
-        ctx = context['ctx']
-        dirty_ctx = context['dirty_ctx']
-
-        # Are we in the first pass but width and height are unknown?
-        width_undetected = (draw_pass == 1) and not w
-        height_undetected = (draw_pass == 1) and not h
-        size_undetected = width_undetected or height_undetected
-
-        # We will draw in the dirty surface in 2 cases:
-        # - Our parent is drawing in the dirty surface, so dirty = True
-        # - This is not the last pass.
-        needs_more_passes = (draw_pass < self.min_draw_pass) or size_undetected
-        dirty = force_dirty or needs_more_passes
-
-        # Before drawing anything,
-        # if the specific node wants to do something, do it here.
-        self.pre_draw(context, draw_pass, dirty)
-
-        if dirty:
-            # Drawing on the dirty surface.
-            # Make sure to grab the returned width and height
-            # as these can be useful in the subsequent passes.
-            w, h = self.draw_content(dirty_ctx, x, y, w, h)
-        else:
-            # Drawing on the true surface.
-            # First we draw border and background.
-            # Note that x, y, w, h are modified to consider padding.
-            x, y, w, h = self.draw_border_and_background(ctx, x, y, w, h)
-            # Then draw the actual content.
-            w, h = self.draw_content(ctx, x, y, w, h)
-
-        # `parent` context for the children nodes.
-        this_parent = {
-            'w': w,
-            'h': h,
-            'x': x,
-            'y': y,
-            'rx': 0,  # Relative position for each child to draw.
-            'ry': 0,  # Relative position for each child to draw.
-        }
+    def record_children(self, display_list, box, clip=None):
+        """
+        Add the boxes of the children to a display list, skipping those
+        entirely outside of `clip`.
+        """
+        if self.paints_directly('paint_children'):
+            display_list.call(
+                lambda ctx: self.paint_children(ctx, box, clip), box.bounds
+            )
+            return
+
+        for child in box.children:
+            if clip is None or intersects(child.bounds, clip):
+                child.node.record(display_list, child, clip)
 
-        # Create the context for the children nodes.
-        child_context = {
-            **context,              # All values are same except:
-            'parent': this_parent,  # The parent.
-            'abs_parent': (         # And, possibly the absolute parent.
-                this_parent if
-                self.position in [Position.ABSOLUTE, Position.RELATIVE]
-                else abs_parent
+    def record(self, display_list, box, clip=None):
+        """
+        Add the drawing operations of this node and its children to a
+        display list, in the same order as `paint` issues them.
+        See `drafter.display_list.DisplayList`.
+        """
+        if self.paints_directly('paint'):
+            display_list.call(
+                lambda ctx: self.paint(ctx, box, clip), box.bounds
             )
-        }
+            return
 
-        # Any updates to do before rendering the children?
-        self.pre_update(context, child_context, draw_pass)
-
-        # Let's save the total children width and height for subsequent passes.
-        self.children_width = 0
-        self.children_height = 0
-        for ci, c in enumerate(self.children):
-            # Draw each child.
-            child_response = c.draw(child_context, 1, dirty)
-            # Update total children size based on the returned values.
-            self.children_width += child_response['dx']
-            self.children_height += child_response['dy']
-
-            # Possibly, update the context for next child.
-            # The main operation in this method is to update the relative
-            # position.
-            self.update(context, child_context, child_response, draw_pass)
-
-        # After everything is drawn,
-        # if the specific node wants to do something, do it here.
-        self.post_draw(context, draw_pass, dirty)
-
-        # If a size was previously unknown
-        # and this is the first pass, we will save the content/children size
-        # for subsequent passes.
-        if width_undetected:
-            this_parent['w'] = max(w, self.children_width)
-        if height_undetected:
-            this_parent['h'] = max(h, self.children_height)
-
-        # If we need to draw another pass, draw it.
-        if needs_more_passes:
-            self.last_pass_context = child_context
-            return self.draw(context, draw_pass + 1, force_dirty)
-
-        # Return the total space taken by this child.
-        if self.position == Position.ABSOLUTE:
-            return {
-                'dx': 0,
-                'dy': 0,
-            }
-        else:
-            return {
-                'dx': this_parent['w'] + margin.left + margin.right,
-                'dy': this_parent['h'] + margin.top + margin.bottom,
-            }
+        self.record_border_and_background(
+            display_list, box.x, box.y, box.w, box.h
+        )
+        self.record_content(display_list, box)
+        self.record_children(display_list, box, clip)
+
+
+# Recording method matching each painting method of Node.
+RECORD_METHODS = {
+    'paint': 'record',
+    'paint_children': 'record_children',
+    'draw_border_and_background': 'record_border_and_background',
+}
+
+# Whether the nodes of a class paint directly, by (class, method name).
+_paints_directly = {}
@@ -1,6 +1,8 @@
 # auto_scale.py
 # Author: Bibek Dahal
 
+import cairo
+
 from drafter.node import Node
 
 
@@ -12,46 +14,65 @@ class AutoScale(Node):
     horizontal: True/False indicating whether to resize horizontally.
     vertical: True/False indicating whether to resize vertically.
     """
-    horizontal = True
-    vertical = True
+    __slots__ = ('horizontal', 'vertical')
 
-    # Needs at least two drawing passes.
-    min_draw_pass = 2
+    defaults = {
+        'horizontal': True,
+        'vertical': True,
+    }
 
-    def pre_update(self, context, child_context, draw_pass):
+    def arrange(self, box):
         """
-        In the second drawing pass, we will scale the cairo context
-        using the size of this node and the total size of the children
-        so that all children are fit to this container.
+        Using the size of this node and the total size of the children,
+        calculate the scaling so that all children fit in this container.
         """
-        if draw_pass == 1:
-            return
+        super().arrange(box)
 
-        # Get our width and height from the previous pass.
-        me = self.last_pass_context['parent']
-        tw, th = me['w'], me['h']
+        # Get our width and height.
+        tw, th = box.cw, box.ch
         # Get the children width and height.
-        cw, ch = self.children_width, self.children_height
+        cw, ch = self.children_extent(box.children, 0, 0)
 
         # Scaling is by default 1, 1
         # It is less than 1 if total size is less than children size.
         sx = tw / cw if self.horizontal and tw < cw else 1
         sy = th / ch if self.vertical and th < ch else 1
+        box.scale = sx, sy
 
-        # Scale the context.
-        ctx = context['ctx']
+    def paint_children(self, ctx, box, clip=None):
+        """
+        Scale the cairo context around the inner origin of this node while
+        painting the children.
+        """
+        sx, sy = box.scale
         ctx.save()
-        ctx.translate(me['x'], me['y'])
+        ctx.translate(box.cx, box.cy)
         ctx.scale(sx, sy)
-        ctx.translate(-me['x'], -me['y'])
+        ctx.translate(-box.cx, -box.cy)
+        super().paint_children(ctx, box, self.child_clip(box, clip))
+        ctx.restore()
 
-    def post_draw(self, context, draw_pass, dirty):
+    def record_children(self, display_list, box, clip=None):
         """
-        After everything is drawn, in the second pass, we want to reset the
-        scaling that was
+        Add the children to a display list, scaled the same way.
         """
-        if draw_pass == 1:
-            return
+        sx, sy = box.scale
+        display_list.push(cairo.Matrix(
+            sx, 0, 0, sy, box.cx - box.cx * sx, box.cy - box.cy * sy
+        ))
+        super().record_children(display_list, box, self.child_clip(box, clip))
+        display_list.pop()
 
-        ctx = context['ctx']
-        ctx.restore()
+    def child_clip(self, box, clip):
+        """
+        Bring the clip to the coordinates of the children.
+        """
+        if clip is None:
+            return None
+        sx, sy = box.scale
+        return (
+            box.cx + (clip[0] - box.cx) / sx,
+            box.cy + (clip[1] - box.cy) / sy,
+            box.cx + (clip[2] - box.cx) / sx,
+            box.cy + (clip[3] - box.cy) / sy,
+        )
@@ -1,6 +1,8 @@
 # canvas.py
 # Author: Bibek Dahal
 
+import cairo
+
 from drafter.node import Node
 
 
@@ -16,10 +18,80 @@ class Canvas(Node):
     A canvas is a rectangular area where the user can use the cairo
     context to draw anything.
 
+    The callback is run once, during layout, and what it draws is recorded,
+    together with the size it returns and its extents, so that drawings
+    going beyond the canvas are not culled. Later layout and paint passes
+    replay the recording, translated to the position of the canvas,
+    instead of running the callback again. The recording is made again when a
+    property of the canvas changes or it is drawn at another size.
+
     Properties:
     draw_callback: Function called to draw in the canvas.
+                   It returns the width and height it used.
+    dynamic: True/False indicating whether the callback draws something
+             different each time, so it must be called on every pass
+             instead of being recorded.
     """
-    draw_callback = draw
+    __slots__ = ('draw_callback', 'dynamic', '_recording')
+
+    defaults = {
+        'draw_callback': draw,
+        'dynamic': False,
+        '_recording': None,
+    }
+
+    def recording(self, ctx, w, h):
+        """
+        Run the callback for the size (w, h) on a recording surface and
+        return (recording, returned size), reusing the last recording when
+        the canvas did not change.
+        """
+        key = (self._version, w, h)
+        if self._recording is not None and self._recording[0] == key:
+            return self._recording[1:]
+
+        surface = cairo.RecordingSurface(cairo.CONTENT_COLOR_ALPHA, None)
+        recording_ctx = cairo.Context(surface)
+        recording_ctx.set_font_options(ctx.get_target().get_font_options())
+        size = self.draw_callback(recording_ctx, w, h)
+        object.__setattr__(self, '_recording', (key, surface, size))
+        return surface, size
+
+    def measure_content(self, ctx, w, h):
+        """
+        The callback is the only one who knows the size of the drawing,
+        so when the width or height is unknown, run it (or replay its
+        recording) for that size. Otherwise, avoid calling it at all.
+        """
+        if w and h:
+            return w, h
+
+        if not self.dynamic:
+            return self.recording(ctx, w, h)[1]
+
+        ctx.save()
+        w, h = self.draw_callback(ctx, w, h)
+        ctx.restore()
+        return w, h
+
+    def layout_content(self, ctx, w, h):
+        """
+        Like `measure_content`, also recording the drawing of a canvas of
+        known size to keep its (x, y, width, height) ink extents.
+        """
+        if self.dynamic:
+            return (*self.measure_content(ctx, w, h), None)
+
+        surface, size = self.recording(ctx, w, h)
+        if not (w and h):
+            w, h = size
+        return w, h, surface.ink_extents()
+
+    def content_bounds(self, box):
+        if box.content is None or not (box.content[2] and box.content[3]):
+            return None
+        x, y, w, h = box.content
+        return (box.cx + x, box.cy + y, box.cx + x + w, box.cy + y + h)
 
     def draw_content(self, ctx, x, y, w, h):
         """
@@ -28,6 +100,17 @@ class Canvas(Node):
         """
         ctx.save()
         ctx.translate(x, y)
-        w, h = self.draw_callback(ctx, w, h)
+        if self.dynamic:
+            self.draw_callback(ctx, w, h)
+        else:
+            recording = self._recording
+            if recording is not None and recording[0][0] == self._version \
+                    and (w, h) == tuple(recording[2]):
+                # Recorded while measuring an unknown size, which turned
+                # out to be this one.
+                surface = recording[1]
+            else:
+                surface = self.recording(ctx, w, h)[0]
+            ctx.set_source_surface(surface, 0, 0)
+            ctx.paint()
         ctx.restore()
-        return w, h
@@ -0,0 +1,149 @@
+# chart.py
+# Author: Bibek Dahal
+
+import numpy as np
+
+from drafter.nodes.canvas import Canvas
+from drafter.utils.color import parse_color
+from drafter.utils.decimate import finite, min_max, lttb
+
+
+class Series:
+    """
+    A line of a Chart.
+
+    Properties:
+    * y: Values, as a NumPy array or any sequence.
+    * x: Positions of the values, increasing, or None for 0, 1, 2...
+    * color: Line color.
+    * line_width: Line width.
+    """
+    def __init__(self, y, x=None, color=[0, 0, 0, 1], line_width=1):
+        self.y = np.asarray(y, dtype=float)
+        self.x = np.arange(len(self.y), dtype=float) if x is None \
+            else np.asarray(x, dtype=float)
+        self.color = parse_color(color)
+        self.line_width = line_width
+
+
+class Chart(Canvas):
+    """
+    A line chart of NumPy series.
+
+    Values are mapped to the chart area with array operations, and each
+    series is reduced to the resolution of the chart before it is turned
+    into a cairo path, so the path grows with the width of the chart and
+    not with the number of values.
+
+    Properties:
+    * series: List of Series.
+    * x_range, y_range: (min, max) shown on each axis, or None to fit all
+                        the values.
+    * decimation: One of (MIN_MAX, LTTB, NONE).
+                  MIN_MAX keeps the first, lowest, highest and last value
+                  of each column and draws the same pixels as the full
+                  series. LTTB keeps two points per column which best
+                  preserve the shape of the line. NONE draws every value.
+    * resolution: Columns per unit of width, e.g. 2 for a page rendered at
+                  twice its size.
+    * axis_color: Color of the lines along the bottom and left edges, or
+                  None for no axes.
+    """
+
+    MIN_MAX = 0
+    LTTB = 1
+    NONE = 2
+
+    __slots__ = (
+        'series', 'x_range', 'y_range', 'decimation', 'resolution',
+        'axis_color',
+    )
+
+    defaults = {
+        'series': [],
+        'x_range': None,
+        'y_range': None,
+        'decimation': MIN_MAX,
+        'resolution': 1,
+        'axis_color': None,
+    }
+
+    # Size of a chart whose width or height is not set.
+    default_size = (300, 150)
+
+    def ranges(self):
+        """
+        Return the (min, max) of the x and y axes.
+        """
+        ranges = []
+        for given, values in [
+            (self.x_range, [s.x for s in self.series]),
+            (self.y_range, [s.y for s in self.series]),
+        ]:
+            if given is None:
+                values = [v[np.isfinite(v)] for v in values]
+                values = [v for v in values if len(v)]
+                given = (
+                    min(v.min() for v in values),
+                    max(v.max() for v in values),
+                ) if values else (0, 1)
+            low, high = given
+            ranges.append((low, high) if high != low else (low - 1, high + 1))
+        return ranges
+
+    def points(self, series, ranges, w, h):
+        """
+        Return the x and y arrays of a series in the coordinates of the
+        chart area, reduced according to `decimation`.
+        """
+        (x0, x1), (y0, y1) = ranges
+        x, y = finite(series.x, series.y)
+        px = (x - x0) * (w / (x1 - x0))
+        py = h - (y - y0) * (h / (y1 - y0))
+
+        columns = max(int(w * self.resolution), 1)
+        if self.decimation == Chart.NONE or len(px) < 2 or \
+                np.any(px[1:] < px[:-1]):
+            return px, py
+        if self.decimation == Chart.LTTB:
+            return lttb(px, py, 2 * columns)
+
+        scale = columns / w
+        px, py = min_max(px * scale, py)
+        return px / scale, py
+
+    def draw_callback(self, ctx, w, h):
+        """
+        Draw the axes and the lines of the chart. Recorded and replayed by
+        Canvas.
+        """
+        w = w or self.default_size[0]
+        h = h or self.default_size[1]
+
+        ctx.save()
+        ctx.rectangle(0, 0, w, h)
+        ctx.clip()
+
+        ranges = self.ranges()
+        for series in self.series:
+            px, py = self.points(series, ranges, w, h)
+            if not len(px):
+                continue
+
+            ctx.move_to(px[0], py[0])
+            for x, y in zip(px[1:].tolist(), py[1:].tolist()):
+                ctx.line_to(x, y)
+            ctx.set_source_rgba(*series.color)
+            ctx.set_line_width(series.line_width)
+            ctx.stroke()
+        ctx.restore()
+
+        if self.axis_color is not None:
+            ctx.move_to(0, 0)
+            ctx.line_to(0, h)
+            ctx.line_to(w, h)
+            ctx.set_source_rgba(*parse_color(self.axis_color))
+            ctx.set_line_width(1)
+            ctx.stroke()
+
+        return w, h
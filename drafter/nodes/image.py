@@ -0,0 +1,108 @@
+# image.py
+# Author: Bibek Dahal
+
+import os
+
+import cairo
+
+from drafter.node import Node
+from drafter.utils.image import (
+    image_key, load_image, scaled_image, VECTOR_SURFACES
+)
+
+
+class Image(Node):
+    """
+    Represents a PNG image.
+
+    Decoded images are kept in a process-wide cache, and so are the
+    variants scaled to the pixel size they are drawn at on image surfaces,
+    so a logo repeated on every page is decoded and resampled only once.
+    On PDF and other vector surfaces, the image is drawn at its own
+    resolution and embedded once per document.
+
+    Properties:
+    * source: Filename or PNG data (bytes) of the image, or a cairo
+              ImageSurface.
+    * mode: One of (FIT, CONTAIN, COVER).
+            FIT stretches the image to the size of the node, CONTAIN
+            scales it to fit inside keeping its aspect ratio and COVER
+            scales it to fill the node keeping its aspect ratio, cropping
+            what is outside.
+
+    When the width or height of the node is not set, it is taken from the
+    image, keeping its aspect ratio.
+    """
+
+    FIT = 0
+    CONTAIN = 1
+    COVER = 2
+
+    __slots__ = ('source', 'mode')
+
+    defaults = {
+        'source': None,
+        'mode': CONTAIN,
+    }
+
+    def cache_key(self):
+        # A file is identified by its modification time and size too.
+        if isinstance(self.source, (str, os.PathLike)):
+            return image_key(self.source)
+        return None
+
+    def measure_content(self, ctx, w, h):
+        if (w and h) or self.source is None:
+            return w, h
+
+        surface = load_image(self.source)[1]
+        iw, ih = surface.get_width(), surface.get_height()
+        if w:
+            return w, w * ih / iw
+        if h:
+            return h * iw / ih, h
+        return iw, ih
+
+    def image_rect(self, iw, ih, w, h):
+        """
+        Return the (x, y, w, h) of the image relative to the content area
+        of size (w, h), according to `mode`.
+        """
+        if self.mode == Image.FIT:
+            return 0, 0, w, h
+
+        sx, sy = w / iw, h / ih
+        if self.mode == Image.COVER:
+            scale = max(sx, sy)
+        else:
+            scale = min(sx, sy)
+        dw, dh = iw * scale, ih * scale
+        return (w - dw) / 2, (h - dh) / 2, dw, dh
+
+    def draw_content(self, ctx, x, y, w, h):
+        if self.source is None or not w or not h:
+            return
+
+        key, surface = load_image(self.source)
+        iw, ih = surface.get_width(), surface.get_height()
+        dx, dy, dw, dh = self.image_rect(iw, ih, w, h)
+
+        ctx.save()
+        if self.mode == Image.COVER:
+            ctx.rectangle(x, y, w, h)
+            ctx.clip()
+
+        if ctx.get_target().get_type() not in VECTOR_SURFACES:
+            # Draw a copy already resampled to the device pixels.
+            pw, ph = ctx.user_to_device_distance(dw, dh)
+            pw, ph = max(round(abs(pw)), 1), max(round(abs(ph)), 1)
+            surface = scaled_image(key, surface, pw, ph)
+            iw, ih = pw, ph
+
+        ctx.translate(x + dx, y + dy)
+        ctx.scale(dw / iw, dh / ih)
+        ctx.set_source_surface(surface, 0, 0)
+        ctx.get_source().set_extend(cairo.EXTEND_PAD)
+        ctx.rectangle(0, 0, iw, ih)
+        ctx.fill()
+        ctx.restore()
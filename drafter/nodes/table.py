@@ -0,0 +1,454 @@
+# table.py
+# Author: Bibek Dahal
+
+import sys
+
+from drafter.node import Node
+from drafter.nodes.text import Text
+from drafter.utils.color import compile_color
+from drafter.utils.field import Field
+from drafter.utils.font import font_options_key
+from drafter.utils.pango import load_pango
+from drafter.utils.pos_size import compile_size, resolve_size
+
+
+# Most distinct strings of a column measured for its automatic width.
+AUTO_WIDTH_SAMPLE = 1000
+
+
+def numpy():
+    """
+    Return NumPy if it is already imported, else None. Data can only hold
+    NumPy arrays if it is, so it is never imported here.
+    """
+    return sys.modules.get('numpy')
+
+
+class TableColumn:
+    """
+    Definition of a column of a Table.
+
+    Properties:
+    * key: Index or name of the column in the data.
+    * title: Title shown in the header.
+    * width: Fixed value, percentage of the table width or None to fit the
+             widest value of the column.
+    * alignment: One of (Text.LEFT, Text.CENTER, Text.RIGHT).
+    * format: Function converting a value to the displayed string.
+
+    The title, width and alignment can be Field placeholders of a
+    template.
+    """
+    def __init__(self, key, title=None, width=None, alignment=Text.LEFT,
+                 format=str):
+        self.key = key
+        self.title = str(key) if title is None else title
+        self.width = width
+        self.alignment = alignment
+        self.format = format
+
+    def __setattr__(self, key, value):
+        object.__setattr__(self, key, value)
+        if key == 'width':
+            # A placeholder is compiled once it is bound.
+            object.__setattr__(self, '_width', compile_size(
+                None if isinstance(value, Field) else value
+            ))
+
+
+def row_count(data):
+    """
+    Number of rows in a data source.
+    """
+    if isinstance(data, dict):
+        return len(next(iter(data.values()), ()))
+    return len(data)
+
+
+def column_values(data, key, start, end):
+    """
+    Values of the column `key` for the rows [start, end) of a data source.
+
+    The data can be a dict of columns (lists or NumPy arrays), a 2D NumPy
+    array or a sequence of rows (sequences or dicts).
+    """
+    np = numpy()
+    if isinstance(data, dict):
+        return data[key][start:end]
+    if np is not None and isinstance(data, np.ndarray):
+        return data[start:end, key]
+    return [row[key] for row in data[start:end]]
+
+
+def distinct(values):
+    """
+    Return the distinct values and, for each value, its index in them.
+    """
+    np = numpy()
+    if np is not None and isinstance(values, np.ndarray):
+        unique, inverse = np.unique(values, return_inverse=True)
+        return list(unique), inverse
+
+    index = {}
+    inverse = [index.setdefault(v, len(index)) for v in values]
+    return list(index), inverse
+
+
+class Table(Node):
+    """
+    A table drawn directly from a data source, without creating a node per
+    cell.
+
+    Only the rows which fit in the height of the table, starting from
+    `start`, are read and drawn; after layout, `end` is the index of the
+    first row left out, so a long table can be paginated by drawing it
+    again with `start = end` until `done`.
+
+    Column widths and row heights are computed from the distinct values of
+    each column, so each distinct value is measured only once.
+
+    Automatic column widths are computed once for the whole data, so that
+    the columns keep their width from page to page. They are measured
+    without going through the layout cache of the Text nodes, which the
+    values of a large table would flood, and from at most
+    AUTO_WIDTH_SAMPLE distinct strings per column: the longest ones by
+    number of characters. A shorter string drawn wider, e.g. 'WWW' among
+    many '1111', can then be wider than its column.
+
+    Properties:
+    * columns: List of TableColumn.
+    * data: A dict of columns (lists or NumPy arrays), a 2D NumPy array or
+            a sequence of rows. Other iterables are read into a list.
+    * start: Index of the first row to draw.
+    * max_rows: Maximum number of rows to draw, or None.
+    * header: True/False indicating whether to draw the column titles.
+    * wrap: True/False indicating whether to wrap long values in fixed
+            width columns. Otherwise, each row is a single line.
+    * font_family, font_size, font_weight: Font of the cells.
+    * header_weight: Font weight of the titles.
+    * color: Font color.
+    * cell_padding: Spacing around the value in each cell.
+    * line_width: Width of the lines between the cells, 0 for none.
+    * line_color: Color of the lines.
+    * header_background: Background color of the header, or None.
+    * stripe_background: Background color of every other row, or None.
+    """
+    __slots__ = (
+        'columns', 'data', 'start', 'max_rows', 'header', 'wrap',
+        'font_family', 'font_size', 'font_weight', 'header_weight', 'color',
+        'cell_padding', 'line_width', 'line_color', 'header_background',
+        'stripe_background', 'end',
+        '_color', '_line_color', '_header_background', '_stripe_background',
+        '_auto_widths',
+    )
+
+    defaults = {
+        'columns': [],
+        'data': (),
+        'start': 0,
+        'max_rows': None,
+        'header': True,
+        'wrap': False,
+        'font_family': 'Arial',
+        'font_size': 8,
+        'font_weight': Text.NORMAL,
+        'header_weight': Text.BOLD,
+        'color': [0, 0, 0, 1],
+        'cell_padding': 2,
+        'line_width': 0.5,
+        'line_color': [0, 0, 0, 1],
+        'header_background': None,
+        'stripe_background': None,
+        'end': 0,
+        '_auto_widths': None,
+    }
+
+    compilers = {
+        **Node.compilers,
+        'color': compile_color,
+        'line_color': compile_color,
+        'header_background': compile_color,
+        'stripe_background': compile_color,
+    }
+
+    layout_outputs = ('end',)
+
+    def __setattr__(self, key, value):
+        # Iterators can not be sliced; read them once.
+        if key == 'data' and not isinstance(value, (dict, Field)) and not (
+            hasattr(value, '__getitem__') and hasattr(value, '__len__')
+        ):
+            value = list(value)
+        super().__setattr__(key, value)
+
+    @property
+    def done(self):
+        """
+        Whether the last layout reached the end of the data.
+        """
+        return self.end >= row_count(self.data)
+
+    def cell_texts(self, weight):
+        """
+        One Text node per column, used to measure and draw all of its
+        cells.
+        """
+        return [
+            Text(
+                markup=False,
+                font_family=self.font_family,
+                font_size=self.font_size,
+                font_weight=weight,
+                alignment=column.alignment,
+            )
+            for column in self.columns
+        ]
+
+    def measure_values(self, ctx, cell, values, width, cached=True):
+        """
+        Return the extents of each of the distinct strings in `values`,
+        shaped through the layout cache unless `cached` is False.
+        """
+        extents = []
+        for value in values:
+            cell.text = value
+            if cached:
+                extents.append(cell.get_layout(ctx, width)[1])
+            else:
+                extents.append(cell.create_layout(ctx, width)[1])
+        return extents
+
+    def auto_widths(self, ctx, cells):
+        """
+        Widths of the columns fitting their widest value over all the rows.
+        Computed once for the data and the font. See the class docstring.
+        """
+        key = (
+            id(self.data), row_count(self.data),
+            tuple((c.key, c.title, c.width, c.format) for c in self.columns),
+            self.font_family, self.font_size, self.font_weight,
+            self.header_weight, self.header, self.cell_padding,
+            font_options_key(ctx),
+        )
+        if self._auto_widths is not None and self._auto_widths[0] == key:
+            return self._auto_widths[1]
+
+        widths = []
+        titles = self.cell_texts(self.header_weight)
+        count = row_count(self.data)
+        for column, cell, title in zip(self.columns, cells, titles):
+            if column.width is not None:
+                widths.append(None)
+                continue
+            values = column_values(self.data, column.key, 0, count)
+            strings = set(column.format(v) for v in distinct(values)[0])
+            if len(strings) > AUTO_WIDTH_SAMPLE:
+                strings = sorted(strings, key=len)[-AUTO_WIDTH_SAMPLE:]
+            width = max(
+                (
+                    e[0] for e in
+                    self.measure_values(ctx, cell, strings, 0, False)
+                ),
+                default=0,
+            )
+            if self.header:
+                extents = self.measure_values(ctx, title, [column.title], 0)
+                width = max(width, extents[0][0])
+            widths.append(width + 2 * self.cell_padding)
+
+        object.__setattr__(self, '_auto_widths', (key, widths))
+        return widths
+
+    def column_widths(self, ctx, cells, w):
+        auto = self.auto_widths(ctx, cells)
+        return [
+            resolve_size(w, column._width) if width is None else width
+            for column, width in zip(self.columns, auto)
+        ]
+
+    def row_heights(self, ctx, cells, inner, start, end):
+        """
+        Heights of the rows [start, end): the tallest cell of each row,
+        measuring each distinct value of a column once.
+        """
+        np = numpy()
+        heights = None
+        for column, cell, width in zip(self.columns, cells, inner):
+            values = column_values(self.data, column.key, start, end)
+            values, inverse = distinct(values)
+            extents = self.measure_values(
+                ctx, cell, [column.format(v) for v in values],
+                width if self.wrap else 0,
+            )
+            if np is not None:
+                column_heights = np.asarray([e[1] for e in extents])[
+                    np.asarray(inverse, dtype=int)
+                ]
+                heights = column_heights if heights is None else \
+                    np.maximum(heights, column_heights)
+            else:
+                column_heights = [extents[i][1] for i in inverse]
+                heights = column_heights if heights is None else \
+                    list(map(max, heights, column_heights))
+
+        if heights is None:
+            return [0] * (end - start)
+        return [float(h) + 2 * self.cell_padding for h in heights]
+
+    def layout(self, ctx, parent_w, parent_h, previous=None):
+        box = super().layout(ctx, parent_w, parent_h, previous)
+        # The end of the page laid out last, even when its box was reused.
+        object.__setattr__(self, 'end', self.start + len(box.content[2]))
+        return box
+
+    def measure_content(self, ctx, w, h):
+        return self.layout_content(ctx, w, h)[:2]
+
+    def layout_content(self, ctx, w, h):
+        """
+        Decide the column widths and the rows that fit on this page.
+        Only those rows are read from the data. The page is
+        (column widths, header height, row heights).
+        """
+        cells = self.cell_texts(self.font_weight)
+        widths = self.column_widths(ctx, cells, w)
+        inner = [max(width - 2 * self.cell_padding, 0) for width in widths]
+
+        header_height = 0
+        if self.header:
+            titles = self.cell_texts(self.header_weight)
+            header_height = max((
+                self.measure_values(
+                    ctx, t, [c.title], width if self.wrap else 0
+                )[0][1]
+                for c, t, width in zip(self.columns, titles, inner)
+            ), default=0) + 2 * self.cell_padding
+
+        count = row_count(self.data)
+        limit = count if self.max_rows is None else \
+            min(count, self.start + self.max_rows)
+        available = h - header_height if h else None
+
+        # Read the rows in chunks of about a page.
+        line = header_height or (self.font_size + 2 * self.cell_padding)
+        chunk = int(available / line) + 1 if available else limit
+
+        heights = []
+        used = 0
+        end = self.start
+        while end < limit:
+            chunk_end = min(limit, end + max(chunk, 1))
+            for height in self.row_heights(ctx, cells, inner, end, chunk_end):
+                if available is not None and used + height > available \
+                        and end > self.start:
+                    limit = end
+                    break
+                used += height
+                heights.append(height)
+                end += 1
+
+        page = (widths, header_height, heights)
+        return max(w, sum(widths)), max(h, header_height + used), page
+
+    def draw_cells(self, ctx, cells, strings, xs, widths, y, height):
+        PangoCairo = load_pango()[1]
+        for cell, string, x, width in zip(cells, strings, xs, widths):
+            inner = max(width - 2 * self.cell_padding, 0)
+            cell.text = string
+            layout, extents = cell.get_layout(ctx, inner if self.wrap else 0)
+
+            dx = 0
+            if not self.wrap:
+                if cell.alignment == Text.CENTER:
+                    dx = (inner - extents[0]) / 2
+                elif cell.alignment == Text.RIGHT:
+                    dx = inner - extents[0]
+
+            ctx.move_to(x + self.cell_padding + dx, y + self.cell_padding)
+            PangoCairo.show_layout(ctx, layout)
+
+    def content_bounds(self, box):
+        # Columns of fixed widths can be wider than the table.
+        widths, header_height, heights = box.content
+        return (
+            box.cx, box.cy,
+            box.cx + sum(widths), box.cy + header_height + sum(heights),
+        )
+
+    def record_content(self, display_list, box):
+        display_list.call(
+            lambda ctx: self.draw_page(ctx, box.content, box.cx, box.cy),
+            box.bounds,
+        )
+
+    def draw_content(self, ctx, x, y, w, h):
+        self.draw_page(ctx, self.layout_content(ctx, w, h)[2], x, y)
+
+    def draw_page(self, ctx, page, x, y):
+        """
+        Draw the header, the rows of a page laid out by `layout_content`
+        and the lines between the cells.
+        """
+        widths, header_height, heights = page
+        xs = []
+        cx = x
+        for width in widths:
+            xs.append(cx)
+            cx += width
+        total_w = cx - x
+        total_h = header_height + sum(heights)
+
+        ctx.save()
+
+        # Backgrounds.
+        if self.header and self._header_background is not None:
+            ctx.rectangle(x, y, total_w, header_height)
+            ctx.set_source_rgba(*self._header_background)
+            ctx.fill()
+        if self._stripe_background is not None:
+            ry = y + header_height
+            for i, height in enumerate(heights):
+                if (self.start + i) % 2:
+                    ctx.rectangle(x, ry, total_w, height)
+                ry += height
+            ctx.set_source_rgba(*self._stripe_background)
+            ctx.fill()
+
+        # Text.
+        ctx.set_source_rgba(*self._color)
+        if self.header:
+            self.draw_cells(
+                ctx, self.cell_texts(self.header_weight),
+                [c.title for c in self.columns], xs, widths, y, header_height,
+            )
+
+        end = self.start + len(heights)
+        columns = [
+            [c.format(v) for v in column_values(
+                self.data, c.key, self.start, end
+            )]
+            for c in self.columns
+        ]
+        cells = self.cell_texts(self.font_weight)
+        ry = y + header_height
+        for i, height in enumerate(heights):
+            strings = [values[i] for values in columns]
+            self.draw_cells(ctx, cells, strings, xs, widths, ry, height)
+            ry += height
+
+        # Lines, stroked at once.
+        if self.line_width:
+            ctx.rectangle(x, y, total_w, total_h)
+            for cx in xs[1:]:
+                ctx.move_to(cx, y)
+                ctx.line_to(cx, y + total_h)
+            ry = y + header_height
+            for height in ([0] if self.header else []) + heights[:-1]:
+                ry += height
+                ctx.move_to(x, ry)
+                ctx.line_to(x + total_w, ry)
+            ctx.set_line_width(self.line_width)
+            ctx.set_source_rgba(*self._line_color)
+            ctx.stroke()
+
+        ctx.restore()
@@ -1,14 +1,21 @@
 # text.py
 # Author: Bibek Dahal
 
-import gi
-gi.require_version('Pango', '1.0')  # noqa
-gi.require_version('PangoCairo', '1.0')  # noqa
+import threading
 
-from gi.repository import Pango, PangoCairo
 from drafter.node import Node
-from drafter.utils.font import get_font_desc
-from drafter.utils.color import parse_color
+from drafter.utils.font import get_font_desc, font_options_key
+from drafter.utils.pango import load_pango
+from drafter.utils.color import compile_color
+from drafter.utils.lru import LRUCache
+from drafter.utils.box import union
+
+
+# Shaped layouts and their extents, shared by all the Text nodes and
+# kept across renders. Use `layout_cache.stats()` to see hits and misses.
+# Layouts belong to the font map of the thread creating them, as
+# PangoCairo font maps are per thread, so the thread is part of the key.
+layout_cache = LRUCache(4096)
 
 
 class Text(Node):
@@ -28,43 +35,58 @@ class Text(Node):
     * font_weight: One of (NORMAL, BOLD).
     """
 
-    WORD_WRAP = Pango.WrapMode.WORD
-    CHAR_WRAP = Pango.WrapMode.WORD_CHAR
-    WORD_CHAR_WRAP = Pango.WrapMode.WORD_CHAR
+    # Values of the Pango.WrapMode, Pango.Weight and Pango.Alignment
+    # enums, so that Pango is only loaded once some text is measured.
+    WORD_WRAP = 0
+    CHAR_WRAP = 2
+    WORD_CHAR_WRAP = 2
 
-    NORMAL = Pango.Weight.NORMAL
-    BOLD = Pango.Weight.BOLD
+    NORMAL = 400
+    BOLD = 700
 
-    LEFT = Pango.Alignment.LEFT
-    CENTER = Pango.Alignment.CENTER
-    RIGHT = Pango.Alignment.RIGHT
+    LEFT = 0
+    CENTER = 1
+    RIGHT = 2
     JUSTIFY = 99
 
     TOP = 9090
     MIDDLE = 9099
     BOTTOM = 9900
 
-    text = None
-    color = [0, 0, 0, 1]
+    __slots__ = (
+        'text', 'color', 'wrap_mode', 'alignment', 'vertical_alignment',
+        'line_spacing', 'markup', 'font_family', 'font_size', 'font_weight',
+        '_color',
+    )
 
-    wrap_mode = WORD_WRAP
-    alignment = LEFT
-    vertical_alignment = TOP
-    line_spacing = None
+    defaults = {
+        'text': None,
+        'color': [0, 0, 0, 1],
 
-    markup = True
-    font_family = 'Arial'
-    font_size = 8
-    font_weight = NORMAL
+        'wrap_mode': WORD_WRAP,
+        'alignment': LEFT,
+        'vertical_alignment': TOP,
+        'line_spacing': None,
 
-    def draw_content(self, ctx, x, y, w, h):
+        'markup': True,
+        'font_family': 'Arial',
+        'font_size': 8,
+        'font_weight': NORMAL,
+    }
+
+    compilers = {**Node.compilers, 'color': compile_color}
+
+    def create_layout(self, ctx, w):
         """
-        Draw the text using Pango.
+        Create the Pango layout for the text and return it together with
+        the width and height of the shaped text.
 
         Note that cairo and pango has different units, so need to use
         Pango.SCALE in numeric values below.
         """
 
+        Pango, PangoCairo = load_pango()
+
         # First create a Pango layout.
         # Any existing transformation can affect the layout, so
         # reset the transformation when creating the layout.
@@ -80,14 +102,14 @@ class Text(Node):
 
         # Set the horizontal alignment.
         if self.alignment == Text.JUSTIFY:
-            layout.set_alignment(Text.LEFT)
+            layout.set_alignment(Pango.Alignment.LEFT)
             layout.set_justify(True)
         else:
-            layout.set_alignment(self.alignment)
+            layout.set_alignment(Pango.Alignment(int(self.alignment)))
 
         # Set line spacing.
         if self.line_spacing is not None:
-            layout.set_spacing(self.line_spacing * Pango.SCALE)
+            layout.set_spacing(int(self.line_spacing * Pango.SCALE))
 
         # Set the text content. If using markup, use set_markup.
         if self.markup:
@@ -101,40 +123,114 @@ class Text(Node):
         if not w:
             layout.set_width(-1)
         else:
-            layout.set_width(w * Pango.SCALE)
+            layout.set_width(int(w * Pango.SCALE))
 
         # Wrap mode when width is limited.
-        layout.set_wrap(self.wrap_mode)
+        layout.set_wrap(Pango.WrapMode(int(self.wrap_mode)))
 
-        # Height.
-        layout.set_height(h * Pango.SCALE)
+        # The height of a layout only matters for ellipsizing, which is not
+        # used, so it is left unset and the layout depends on the width only.
 
         # Get the actual width and height of the layout based on text content.
         extents = layout.get_extents()[1]
-        extents = [
+        return layout, (
             extents.width / Pango.SCALE,
             extents.height / Pango.SCALE,
-        ]
+        )
+
+    def get_layout(self, ctx, w):
+        """
+        Return the layout and extents for the text from `layout_cache`,
+        creating them if needed.
+
+        Layouts are never modified after being created, so the same layout
+        is shared by the measuring and the drawing, and by all the nodes
+        with identical text and style, within a thread. Threads painting
+        tiles or rendering jobs shape their own layouts.
+        """
+        key = (
+            str(self.text), self.markup,
+            self.font_family, self.font_size, self.font_weight,
+            self.wrap_mode, self.alignment, self.line_spacing,
+            font_options_key(ctx), threading.get_ident(),
+        )
+
+        # Text whose width was decided by the content is drawn with exactly
+        # its natural width, which is the same as not limiting the width.
+        if w:
+            natural = layout_cache.peek(key + (0,))
+            if natural is not None and natural[1][0] == w:
+                w = 0
+
+        key = key + (w,)
+        value = layout_cache.get(key)
+        if value is None:
+            value = self.create_layout(ctx, w)
+            layout_cache.put(key, value)
+        return value
+
+    def measure_content(self, ctx, w, h):
+        """
+        Shape the text without drawing it and return the actual width and
+        height of the text content.
+        """
+        return self.layout_content(ctx, w, h)[:2]
+
+    def layout_content(self, ctx, w, h):
+        """
+        Like `measure_content`, also keeping the extents of the text, which
+        can overflow a fixed size.
+        """
+        _, extents = self.get_layout(ctx, w)
+        return max(w, extents[0]), max(h, extents[1]), extents
+
+    def content_bounds(self, box):
+        if box.content is None:
+            return None
+        x, y = box.cx, self.text_y(box.cy, box.ch, box.content)
+        return (x - 1, y - 1, x + box.content[0] + 1, y + box.content[1] + 1)
+
+    def text_y(self, y, h, extents):
+        """
+        Return the top of the text in a content area starting at `y` and
+        of height `h`, based on the vertical alignment.
+        """
+        if h:
+            if self.vertical_alignment == Text.BOTTOM:
+                return y + h - extents[1]
+            elif self.vertical_alignment == Text.MIDDLE:
+                return y + h / 2 - extents[1] / 2
+        return y
+
+    def record_content(self, display_list, box):
+        """
+        Add the text to a display list, positioned without transforming
+        the context.
+        """
+        layout, extents = self.get_layout(display_list.ctx, box.cw)
+        x, y = box.cx, self.text_y(box.cy, box.ch, extents)
+        bounds = union(box.bounds, (
+            x - 1, y - 1, x + extents[0] + 1, y + extents[1] + 1,
+        ))
+        display_list.text(x, y, layout, self._color, bounds)
+
+    def draw_content(self, ctx, x, y, w, h):
+        """
+        Draw the text using Pango.
+        """
+        layout, extents = self.get_layout(ctx, w)
 
         # To draw at given position, we will use the translate function.
         # So need to save the cairo context before doing that.
         ctx.save()
         # Translate to the given x and y position.
         # Based on the vertical alignment, the y position can vary.
-        if h:
-            if self.vertical_alignment == Text.BOTTOM:
-                y = y + h - extents[1]
-            elif self.vertical_alignment == Text.MIDDLE:
-                y = y + h / 2 - extents[1] / 2
-        ctx.translate(x, y)
+        ctx.translate(x, self.text_y(y, h, extents))
 
         # Set the font color.
-        ctx.set_source_rgba(*parse_color(self.color))
+        ctx.set_source_rgba(*self._color)
         # Draw the text.
-        PangoCairo.show_layout(ctx, layout)
+        load_pango()[1].show_layout(ctx, layout)
 
         # Restore the cairo context.
         ctx.restore()
-
-        # Return the actual width and height of the text content.
-        return max(w, extents[0]), max(h, extents[1])
@@ -1,57 +1,468 @@
 # report.py
 # Author: Bibek Dahal
 
+import io
+import math
+
 import cairo
 
+from drafter.cache import output_key
+from drafter.engine import layout, paint, paint_region
+from drafter.tiles import write_tiled_png, write_tile_pyramid
+from drafter.utils.surface import surface_array
+
+
+class Measure:
+    """
+    Kinds of surface used to measure the content during layout.
+
+    * SINK: A tiny surface of the same kind as the output, so text has the
+            same metrics but nothing is allocated for the page.
+    * RECORDING: An unbounded recording surface.
+    * FULL: A surface as large as the output, as used to be done.
+    """
+    SINK = 0
+    RECORDING = 1
+    FULL = 2
+
+
+def write_output(target, data):
+    """
+    Write encoded output to a filename or a writable file-like object.
+    """
+    if target is None:
+        return
+    if hasattr(target, 'write'):
+        target.write(data)
+    else:
+        with open(target, 'wb') as f:
+            f.write(data)
+
+
+def reusable_box(box, root_node, incremental):
+    """
+    The box of the last page, if it can be reused to lay out `root_node`.
+    """
+    if incremental and box is not None and box.node is root_node:
+        return box
+    return None
+
 
 class Report():
-    def __init__(self, filename, width, height):
+    """
+    Properties:
+    * filename: Default output of `draw_page`.
+    * width, height: Size of the page.
+    * measure: Kind of surface used to measure the content, see Measure.
+    * cache: An OutputCache (see `drafter.cache`) of the pages drawn
+             before, or None. A page whose tree is equal to one in the
+             cache is written from it without being laid out.
+    * incremental: Whether drawing the same root node again reuses the
+                   layout of the last page, so that only the nodes whose
+                   properties were set since then are measured again.
+                   Content changed in place, e.g. rows appended to the
+                   data of a table, is then not seen; assign the property
+                   again instead, as `Template.bind` does.
+    """
+    # Name of the output format, part of the key of cached outputs.
+    format = None
+
+    def __init__(self, filename, width, height, measure=Measure.SINK,
+                 cache=None, incremental=False):
         self.filename = filename
         self.width = width
         self.height = height
+        self.measure = measure
+        self.cache = cache
+        self.incremental = incremental
+
+        # Box of the last page, reused when the same tree is drawn again
+        # incrementally.
+        self.box = None
 
     def get_surface(self, filename, width, height):
         raise NotImplementedError
 
+    def get_sink_surface(self):
+        """
+        Smallest surface with the same font options as the output.
+        """
+        return cairo.RecordingSurface(cairo.CONTENT_COLOR_ALPHA, None)
+
+    def get_measure_surface(self, width, height):
+        """
+        Surface backing the context used during layout, based on `measure`.
+        Only canvases with an unknown size ever draw on it.
+        """
+        if self.measure == Measure.FULL:
+            return self.get_surface(None, width, height)
+        if self.measure == Measure.RECORDING:
+            return cairo.RecordingSurface(cairo.CONTENT_COLOR_ALPHA, None)
+        return self.get_sink_surface()
+
     def finish_drawing(self, surface, filename):
         raise NotImplementedError
 
-    def draw_page(self, root_node):
-        surface = self.get_surface(self.filename, self.width, self.height)
-        dirty_surface = self.get_surface(None, self.width, self.height)
+    def draw_page(self, root_node, target=None):
+        """
+        Draw the page and write it to `target`, which is a filename or a
+        writable file-like object. It defaults to the report's filename.
+
+        With a cache, the encoded output is also returned as bytes; when
+        an equal tree was drawn at the same size before, it is taken from
+        the cache instead of being drawn.
+        """
+        if target is None:
+            target = self.filename
+
+        key = self.cache_key(root_node) if self.cache is not None else None
+        if key is None:
+            surface = self.render(root_node, target)
+            self.finish_drawing(surface, target)
+            return None
+
+        data = self.cache.get(key)
+        if data is None:
+            stream = io.BytesIO()
+            self.finish_drawing(self.render(root_node, stream), stream)
+            data = stream.getvalue()
+            self.cache.put(key, data)
+        write_output(target, data)
+        return data
+
+    def cache_key(self, root_node):
+        """
+        Key of the output of `root_node` in the cache, from the tree, the
+        size and format of the page and the version of cairo, or None
+        when the tree can not be cached. See `drafter.cache.output_key`.
+        """
+        return output_key(
+            root_node, type(self).__qualname__, self.format, self.width,
+            self.height, self.measure, cairo.cairo_version(),
+        )
 
+    def draw_bytes(self, root_node):
+        """
+        Draw the page and return the encoded output as bytes.
+        """
+        stream = io.BytesIO()
+        self.draw_page(root_node, stream)
+        return stream.getvalue()
+
+    async def draw_page_async(self, root_node, target=None, executor=None,
+                              timeout=None):
+        """
+        Like `draw_page`, but run in `executor` (a thread pool by default)
+        so that the event loop is not blocked while the page is drawn.
+
+        Raises asyncio.TimeoutError after `timeout` seconds. On a timeout
+        or cancellation, a render that did not start yet is dropped; one
+        that already started finishes in the background and is ignored.
+        Renders of the same report should not overlap; await each one
+        before starting the next.
+        """
+        import asyncio
+        loop = asyncio.get_running_loop()
+        return await asyncio.wait_for(
+            loop.run_in_executor(executor, self.draw_page, root_node, target),
+            timeout,
+        )
+
+    async def draw_bytes_async(self, root_node, executor=None, timeout=None):
+        """
+        Like `draw_bytes`, without blocking the event loop.
+        See `draw_page_async`.
+        """
+        import asyncio
+        loop = asyncio.get_running_loop()
+        return await asyncio.wait_for(
+            loop.run_in_executor(executor, self.draw_bytes, root_node),
+            timeout,
+        )
+
+    def render(self, root_node, target=None):
+        """
+        Lay out and paint the page on a new surface and return the surface,
+        without finishing it.
+        """
+        surface = self.get_surface(target, self.width, self.height)
         ctx = cairo.Context(surface)
-        dirty_ctx = cairo.Context(dirty_surface)
-
-        body = {
-            'w': 256,
-            'h': 256,
-            'x': 0,
-            'y': 0,
-            'rx': 0,
-            'ry': 0,
-        }
-        root_node.draw({
-            'ctx': ctx,
-            'dirty_ctx': dirty_ctx,
-            'parent': body,
-            'abs_parent': body
-        })
-
-        self.finish_drawing(surface, self.filename)
+
+        # Measure everything first, then paint the resolved boxes once.
+        paint(ctx, self.layout(root_node))
+        return surface
+
+    def render_region(self, root_node, region=None, scale=1, target=None):
+        """
+        Lay out the page and paint only its (x, y, w, h) `region`, the
+        whole page by default, at `scale` on a new surface of the scaled
+        size of the region, and return the surface without finishing it.
+
+        Nodes entirely outside of the region are not painted at all, and
+        nothing is allocated for the rest of the page.
+        """
+        if region is None:
+            region = (0, 0, self.width, self.height)
+        width = max(math.ceil(region[2] * scale), 1)
+        height = max(math.ceil(region[3] * scale), 1)
+
+        surface = self.get_surface(target, width, height)
+        paint_region(
+            cairo.Context(surface), self.layout(root_node), region, scale
+        )
+        return surface
+
+    def draw_region(self, root_node, region=None, scale=1, target=None):
+        """
+        Draw the (x, y, w, h) `region` of the page at `scale` and write it
+        to `target`, as `draw_page` does. See `render_region`.
+        """
+        if target is None:
+            target = self.filename
+        surface = self.render_region(root_node, region, scale, target)
+        self.finish_drawing(surface, target)
+
+    def draw_thumbnail(self, root_node, size=200, target=None):
+        """
+        Draw the whole page scaled down to fit in a square of `size`.
+        """
+        scale = min(size / self.width, size / self.height, 1)
+        self.draw_region(root_node, None, scale, target)
+
+    def layout(self, root_node):
+        """
+        Lay out the page without painting it and return the root box.
+        When incremental and the same tree was drawn before, only what was
+        set since then is measured again.
+        """
+        measure_surface = self.get_measure_surface(self.width, self.height)
+        measure_ctx = cairo.Context(measure_surface)
+
+        previous = reusable_box(self.box, root_node, self.incremental)
+        self.box = layout(
+            root_node, self.width, self.height, measure_ctx, previous
+        )
+        return self.box
 
 
 class PngReport(Report):
+    format = 'png'
+
     def get_surface(self, filename, width, height):
         return cairo.ImageSurface(cairo.FORMAT_ARGB32, width, height)
 
+    def get_sink_surface(self):
+        return cairo.ImageSurface(cairo.FORMAT_ARGB32, 1, 1)
+
     def finish_drawing(self, surface, filename):
         surface.write_to_png(filename)
 
+    def draw_array(self, root_node):
+        """
+        Draw the page and return its pixels as a NumPy array viewing the
+        surface data, without copying or encoding it.
+        See `drafter.utils.surface.surface_array`.
+        """
+        return surface_array(self.render(root_node))
+
+    def draw_tiled(self, root_node, target=None, tile_size=512, workers=1):
+        """
+        Draw the page to a PNG without allocating a surface for the whole
+        page: it is laid out once, then painted in tiles of `tile_size`
+        pixels, optionally by several threads, and each row of tiles is
+        encoded as soon as it is painted. Requires NumPy.
+        See `drafter.tiles.write_tiled_png`.
+        """
+        if target is None:
+            target = self.filename
+        write_tiled_png(
+            self.layout(root_node), self.width, self.height, target,
+            tile_size, workers,
+        )
+
+    def draw_tile_pyramid(self, root_node, directory, tile_size=256,
+                          workers=1):
+        """
+        Draw the page as a pyramid of PNG tiles in `directory` and return
+        the number of levels. See `drafter.tiles.write_tile_pyramid`.
+        """
+        return write_tile_pyramid(
+            self.layout(root_node), self.width, self.height, directory,
+            tile_size, workers,
+        )
+
 
 class PdfReport(Report):
+    format = 'pdf'
+
     def get_surface(self, filename, width, height):
         return cairo.PDFSurface(filename, width, height)
 
+    def get_sink_surface(self):
+        return cairo.PDFSurface(None, 1, 1)
+
     def finish_drawing(self, surface, filename):
         surface.show_page()
+        surface.finish()
+
+
+class Document():
+    """
+    A multi-page PDF document.
+
+    All the pages are written to a single PDFSurface, one at a time: each
+    root node is laid out, painted and emitted with `show_page` before the
+    next one is added, so memory does not grow with the number of pages.
+    A single measuring surface is reused for every page.
+    With `incremental`, adding the same root node again reuses the layout
+    of the last page, as `Report` does.
+
+    Usage:
+        with Document('statement.pdf', 595, 842) as doc:
+            for root_node in pages:
+                doc.add_page(root_node)
+    """
+    def __init__(self, filename, width, height, incremental=False):
+        self.filename = filename
+        self.width = width
+        self.height = height
+        self.incremental = incremental
+        self.page_count = 0
+
+        # Box of the last page, reused when the same tree is added again
+        # incrementally.
+        self.box = None
+
+        self.surface = cairo.PDFSurface(filename, width, height)
+        self.ctx = cairo.Context(self.surface)
+
+        # A PDF surface without output, so that text is measured with the
+        # same font options as the real one.
+        self.measure_surface = cairo.PDFSurface(None, 1, 1)
+        self.measure_ctx = cairo.Context(self.measure_surface)
+
+    def add_page(self, root_node, width=None, height=None):
+        """
+        Lay out, paint and emit one page.
+        The page size defaults to the size of the document.
+        """
+        width = width or self.width
+        height = height or self.height
+        self.surface.set_size(width, height)
+
+        previous = reusable_box(self.box, root_node, self.incremental)
+        box = layout(root_node, width, height, self.measure_ctx, previous)
+        paint(self.ctx, box)
+        self.surface.show_page()
+        self.box = box
+
+        # Drop whatever canvases drew while being measured.
+        self.measure_surface.show_page()
+        self.page_count += 1
+
+    def close(self):
+        """
+        Finish the document and flush it to the output.
+        """
+        self.surface.finish()
+        self.measure_surface.finish()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+
+class RecordedPage():
+    """
+    A page laid out and painted once, onto a cairo recording surface,
+    which can then be replayed to any number of outputs (PDF, PNG at any
+    scale, SVG) without going through the node tree again.
+
+    Text is measured on the recording surface, i.e. with the unhinted
+    metrics PDF output uses, so all the outputs share one layout.
+
+    Usage:
+        page = RecordedPage(root_node, 595, 842)
+        page.write_pdf('page.pdf')
+        page.write_png('page.png', scale=2)
+        page.write_png('thumbnail.png', scale=200 / 842)
+    """
+    def __init__(self, root_node, width, height):
+        self.width = width
+        self.height = height
+        self.surface = cairo.RecordingSurface(
+            cairo.CONTENT_COLOR_ALPHA, cairo.Rectangle(0, 0, width, height)
+        )
+        ctx = cairo.Context(self.surface)
+        self.box = layout(root_node, width, height, ctx)
+        paint(ctx, self.box)
+
+    def replay(self, ctx, scale=1):
+        """
+        Paint the recorded page on a cairo context, at `scale`.
+        """
+        ctx.save()
+        ctx.scale(scale, scale)
+        ctx.set_source_surface(self.surface, 0, 0)
+        ctx.paint()
+        ctx.restore()
+
+    def write_vector(self, surface):
+        """
+        Replay the page on a vector surface of the size of the page and
+        finish it.
+        """
+        self.replay(cairo.Context(surface))
+        surface.show_page()
+        surface.finish()
+
+    def write_pdf(self, target):
+        """
+        Write the page as a PDF to a filename or a writable file-like
+        object.
+        """
+        self.write_vector(cairo.PDFSurface(target, self.width, self.height))
+
+    def write_svg(self, target):
+        """
+        Write the page as an SVG to a filename or a writable file-like
+        object.
+        """
+        self.write_vector(cairo.SVGSurface(target, self.width, self.height))
+
+    def render_png(self, scale=1):
+        """
+        Return an ARGB32 ImageSurface of the page at `scale`.
+        """
+        surface = cairo.ImageSurface(
+            cairo.FORMAT_ARGB32,
+            max(math.ceil(self.width * scale), 1),
+            max(math.ceil(self.height * scale), 1),
+        )
+        self.replay(cairo.Context(surface), scale)
+        surface.flush()
+        return surface
+
+    def write_png(self, target, scale=1):
+        """
+        Write the page as a PNG at `scale` to a filename or a writable
+        file-like object.
+        """
+        self.render_png(scale).write_to_png(target)
+
+    def to_bytes(self, format, scale=1):
+        """
+        Return the page encoded as 'pdf', 'svg' or 'png' (at `scale`).
+        """
+        stream = io.BytesIO()
+        if format == 'pdf':
+            self.write_pdf(stream)
+        elif format == 'svg':
+            self.write_svg(stream)
+        elif format == 'png':
+            self.write_png(stream, scale)
+        else:
+            raise Exception('Unknown format: %s' % format)
+        return stream.getvalue()
@@ -0,0 +1,520 @@
+# server.py
+# Author: Bibek Dahal
+#
+# A long-running render server, so that Python, Pango and the fonts are
+# loaded once rather than for every document.
+#
+# Usage:
+#     python -m drafter.server --socket /tmp/drafter.sock --workers 4
+#     python -m drafter.server --stdio
+#
+# Requests and responses are JSON objects, one per line. A render request:
+#
+#     {"id": 1, "template": {"type": "Text", "text": {"field": "name"}},
+#      "data": {"name": "Bibek"}, "format": "png", "width": 200,
+#      "height": 50, "priority": 0}
+#
+# `template` is a node tree as read by `drafter.template.load_node`, bound
+# to `data` ({} by default, so fields take their default values).
+# Optional keys: `scale` (PNG only), `output` (a path relative to the
+# --output-dir of the server to write to instead of returning the data;
+# refused without --output-dir) and `priority` (lower is served first, 0
+# by default). The response is
+#
+#     {"id": 1, "ok": true, "data": "<base64>", "render_ms": 3.2}
+#
+# or {"id": 1, "ok": false, "error": "..."}. A request {"type": "metrics"}
+# returns the metrics of the server and {"type": "ping"} returns
+# {"ok": true}.
+#
+# With --cache-dir, the outputs of whole pages are cached by the content
+# of their tree, in memory in each worker and on disk for all of them, so
+# an identical request is answered without laying anything out.
+
+import argparse
+import asyncio
+import base64
+import hashlib
+import io
+import itertools
+import json
+import multiprocessing
+import os
+import signal
+import stat
+import sys
+import traceback
+from collections import deque
+from time import perf_counter
+
+
+# Recent latencies kept to compute percentiles.
+LATENCY_WINDOW = 1000
+
+
+def memory_usage():
+    """
+    Resident memory of this process in bytes.
+    """
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError):
+        import resource
+        # Peak rather than current usage, in kilobytes on Linux.
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+def cache_stats(output_cache=None):
+    """
+    Counters of the caches of this process.
+    """
+    from drafter.nodes.text import layout_cache
+    from drafter.utils.image import image_cache, scaled_cache
+    stats = {
+        'layouts': layout_cache.stats(),
+        'images': image_cache.stats(),
+        'scaled_images': scaled_cache.stats(),
+    }
+    if output_cache is not None:
+        stats['outputs'] = output_cache.stats()
+    return stats
+
+
+class JobRunner:
+    """
+    Renders jobs in a worker process, keeping the compiled templates and
+    the reports (with the box of their last page) of recent jobs, so that
+    a template drawn again only lays out what its new data changed.
+    Whole pages are also taken from `cache`, an OutputCache, if given.
+    Outputs are only written to files inside `output_dir`, if given.
+    """
+    def __init__(self, max_templates=64, cache=None, output_dir=None):
+        from drafter.utils.lru import LRUCache
+        self.templates = LRUCache(max_templates)
+        self.reports = LRUCache(max_templates)
+        self.cache = cache
+        self.output_dir = output_dir
+
+    def template(self, spec):
+        from drafter.template import Template
+
+        key = hashlib.sha1(
+            json.dumps(spec, sort_keys=True).encode()
+        ).hexdigest()
+        template = self.templates.get(key)
+        if template is None:
+            template = Template.from_json(spec)
+            self.templates.put(key, template)
+        return key, template
+
+    def output_path(self, output):
+        """
+        Resolve the `output` of a job inside `output_dir`.
+        """
+        if self.output_dir is None:
+            raise Exception('Writing to files is disabled; '
+                            'start the server with --output-dir')
+        directory = os.path.realpath(self.output_dir)
+        path = os.path.realpath(os.path.join(directory, output))
+        if os.path.commonpath([directory, path]) != directory or \
+                path == directory:
+            raise Exception('Output outside of the output directory: %s'
+                            % output)
+        return path
+
+    def run(self, job):
+        from drafter.batch import REPORTS
+
+        key, template = self.template(job['template'])
+        # Always bind, so that nothing is left from the previous job.
+        root_node = template.bind(job.get('data') or {})
+
+        format = job.get('format', 'png')
+        width, height = job['width'], job['height']
+        report_key = (key, format, width, height)
+        report = self.reports.get(report_key)
+        if report is None:
+            report = REPORTS[format](
+                None, width, height, cache=self.cache, incremental=True,
+            )
+            self.reports.put(report_key, report)
+
+        output = job.get('output')
+        target = self.output_path(output) if output else io.BytesIO()
+        scale = job.get('scale', 1)
+        if scale != 1:
+            report.draw_region(root_node, None, scale, target)
+        else:
+            report.draw_page(root_node, target)
+
+        if output:
+            return {'path': target}
+        return {'data': base64.b64encode(target.getvalue()).decode()}
+
+
+def worker_main(conn, fonts, cache_dir=None, cache_size=None,
+                output_dir=None):
+    """
+    Loop of a worker process: warm up, then render the jobs received on
+    `conn` until None is received.
+    """
+    from drafter import warmup
+    from drafter.cache import OutputCache
+    warmup([tuple(f) for f in fonts])
+    cache = None
+    if cache_dir is not None:
+        cache = OutputCache(cache_dir) if cache_size is None else \
+            OutputCache(cache_dir, max_disk=cache_size)
+    runner = JobRunner(cache=cache, output_dir=output_dir)
+
+    while True:
+        try:
+            job = conn.recv()
+        except EOFError:
+            # The server is gone.
+            break
+        if job is None:
+            break
+
+        start = perf_counter()
+        try:
+            response = {'ok': True, **runner.run(job)}
+        except Exception:
+            response = {'ok': False, 'error': traceback.format_exc()}
+        response['render_ms'] = (perf_counter() - start) * 1000
+        conn.send((response, memory_usage(), cache_stats(cache)))
+    conn.close()
+
+
+class Worker:
+    """
+    A worker process and the pipe to it.
+    """
+    context = multiprocessing.get_context('spawn')
+
+    def __init__(self, fonts=(), cache_dir=None, cache_size=None,
+                 output_dir=None):
+        self.conn, child_conn = self.context.Pipe()
+        self.process = self.context.Process(
+            target=worker_main,
+            args=(child_conn, list(fonts), cache_dir, cache_size, output_dir),
+            daemon=True,
+        )
+        self.process.start()
+        child_conn.close()
+        self.jobs = 0
+        self.memory = 0
+        self.stats = {}
+
+    async def render(self, job):
+        """
+        Send a job to the process and wait for its response.
+        """
+        loop = asyncio.get_running_loop()
+        self.conn.send(job)
+        response, self.memory, self.stats = await loop.run_in_executor(
+            None, self.conn.recv
+        )
+        self.jobs += 1
+        return response
+
+    def stop(self):
+        try:
+            self.conn.send(None)
+        except (BrokenPipeError, OSError):
+            pass
+        self.process.join(5)
+        if self.process.is_alive():
+            self.process.kill()
+        self.conn.close()
+
+
+class Server:
+    """
+    Accepts render jobs, queues them by priority and renders them on a
+    pool of worker processes which keep fonts and caches warm.
+
+    Properties:
+    * workers: Number of worker processes.
+    * memory_limit: Resident memory, in bytes, above which a worker is
+                    replaced after its current job, or None.
+    * max_jobs: Number of jobs after which a worker is replaced, or None.
+    * fonts: List of (family, size, weight) each worker loads in advance.
+    * cache_dir: Directory of the output cache shared by the workers, or
+                 None for no output cache.
+    * cache_size: Maximum size in bytes of the output cache on disk, or
+                  None for the default.
+    * output_dir: Directory jobs may write their output to, or None to
+                  refuse jobs with an `output`.
+    """
+    def __init__(self, workers=None, memory_limit=None, max_jobs=None,
+                 fonts=(), cache_dir=None, cache_size=None, output_dir=None):
+        self.workers = workers or os.cpu_count() or 1
+        self.memory_limit = memory_limit
+        self.max_jobs = max_jobs
+        self.fonts = fonts
+        self.cache_dir = cache_dir
+        self.cache_size = cache_size
+        self.output_dir = output_dir
+
+        self.queue = None
+        self.counter = itertools.count()
+        self.latencies = deque(maxlen=LATENCY_WINDOW)
+        self.render_times = deque(maxlen=LATENCY_WINDOW)
+        self.completed = 0
+        self.failed = 0
+        self.in_flight = 0
+        self.recycled = 0
+        self.pool = []
+        self.tasks = []
+
+    async def start(self):
+        self.queue = asyncio.PriorityQueue()
+        self.pool = [self.new_worker() for _ in range(self.workers)]
+        self.tasks = [
+            asyncio.ensure_future(self.dispatch(i))
+            for i in range(self.workers)
+        ]
+
+    async def stop(self):
+        for task in self.tasks:
+            task.cancel()
+        await asyncio.gather(*self.tasks, return_exceptions=True)
+        for worker in self.pool:
+            worker.stop()
+
+    async def dispatch(self, index):
+        """
+        Feed the jobs of the queue to the worker at `index` of the pool,
+        replacing it when it exceeds its limits or dies.
+        """
+        while True:
+            _, _, job, future, submitted = await self.queue.get()
+            if future.cancelled():
+                continue
+
+            worker = self.pool[index]
+            self.in_flight += 1
+            try:
+                response = await worker.render(job)
+            except (EOFError, OSError):
+                response = {'ok': False, 'error': 'Worker died'}
+                worker.process.kill()
+                self.replace(index)
+            finally:
+                self.in_flight -= 1
+
+            self.latencies.append((perf_counter() - submitted) * 1000)
+            if 'render_ms' in response:
+                self.render_times.append(response['render_ms'])
+            if response['ok']:
+                self.completed += 1
+            else:
+                self.failed += 1
+            if not future.cancelled():
+                future.set_result(response)
+
+            worker = self.pool[index]
+            if (
+                self.memory_limit is not None and
+                worker.memory > self.memory_limit
+            ) or (
+                self.max_jobs is not None and worker.jobs >= self.max_jobs
+            ):
+                worker.stop()
+                self.replace(index)
+
+    def new_worker(self):
+        return Worker(
+            self.fonts, self.cache_dir, self.cache_size, self.output_dir
+        )
+
+    def replace(self, index):
+        self.pool[index] = self.new_worker()
+        self.recycled += 1
+
+    async def submit(self, job):
+        """
+        Queue a render job and wait for its response.
+        """
+        future = asyncio.get_running_loop().create_future()
+        self.queue.put_nowait((
+            job.get('priority', 0), next(self.counter), job, future,
+            perf_counter(),
+        ))
+        return await future
+
+    def metrics(self):
+        """
+        Queue depth, counts, latency percentiles in milliseconds and the
+        cache counters of each worker.
+        """
+        return {
+            'queue_depth': self.queue.qsize(),
+            'in_flight': self.in_flight,
+            'completed': self.completed,
+            'failed': self.failed,
+            'recycled_workers': self.recycled,
+            'latency_ms': percentiles(self.latencies),
+            'render_ms': percentiles(self.render_times),
+            'workers': [
+                {
+                    'pid': w.process.pid,
+                    'jobs': w.jobs,
+                    'memory': w.memory,
+                    'caches': w.stats,
+                }
+                for w in self.pool
+            ],
+        }
+
+    async def handle(self, request):
+        """
+        Return the response to a request.
+        """
+        kind = request.get('type', 'render')
+        if kind == 'ping':
+            response = {'ok': True}
+        elif kind == 'metrics':
+            response = {'ok': True, 'metrics': self.metrics()}
+        elif kind == 'render':
+            response = await self.submit(request)
+        else:
+            response = {'ok': False, 'error': 'Unknown request: %s' % kind}
+        return {'id': request.get('id'), **response}
+
+    async def serve_lines(self, reader, write):
+        """
+        Answer the JSON requests read line by line from `reader`, each as
+        soon as it is ready, by calling `write` with the response line.
+        """
+        pending = set()
+
+        async def answer(line):
+            try:
+                response = await self.handle(json.loads(line))
+            except Exception:
+                response = {'ok': False, 'error': traceback.format_exc()}
+            await write((json.dumps(response) + '\n').encode())
+
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                if line.strip():
+                    task = asyncio.ensure_future(answer(line))
+                    pending.add(task)
+                    task.add_done_callback(pending.discard)
+            await asyncio.gather(*pending)
+        finally:
+            for task in pending:
+                task.cancel()
+
+    async def serve_unix(self, path):
+        async def client(reader, writer):
+            lock = asyncio.Lock()
+
+            async def write(data):
+                async with lock:
+                    writer.write(data)
+                    await writer.drain()
+
+            try:
+                await self.serve_lines(reader, write)
+            finally:
+                writer.close()
+
+        # Only a socket left by an earlier server is removed.
+        try:
+            mode = os.stat(path).st_mode
+        except FileNotFoundError:
+            pass
+        else:
+            if not stat.S_ISSOCK(mode):
+                raise Exception('Not a socket: %s' % path)
+            os.unlink(path)
+        server = await asyncio.start_unix_server(client, path)
+        async with server:
+            await server.serve_forever()
+
+    async def serve_stdio(self):
+        loop = asyncio.get_running_loop()
+        reader = asyncio.StreamReader(limit=2 ** 26)
+        await loop.connect_read_pipe(
+            lambda: asyncio.StreamReaderProtocol(reader), sys.stdin
+        )
+
+        async def write(data):
+            sys.stdout.buffer.write(data)
+            sys.stdout.buffer.flush()
+
+        await self.serve_lines(reader, write)
+
+
+def percentiles(values):
+    """
+    The 50th, 90th and 99th percentiles of `values`.
+    """
+    values = sorted(values)
+    if not values:
+        return {'p50': None, 'p90': None, 'p99': None}
+    return {
+        'p%d' % p: values[min(len(values) - 1, len(values) * p // 100)]
+        for p in [50, 90, 99]
+    }
+
+
+async def serve(args):
+    server = Server(
+        args.workers,
+        args.memory_limit * 1024 * 1024 if args.memory_limit else None,
+        args.max_jobs,
+        cache_dir=args.cache_dir,
+        cache_size=args.cache_size * 1024 * 1024 if args.cache_size
+        else None,
+        output_dir=args.output_dir,
+    )
+    await server.start()
+
+    # Stop the workers on termination too.
+    task = asyncio.current_task()
+    loop = asyncio.get_running_loop()
+    for signum in [signal.SIGINT, signal.SIGTERM]:
+        loop.add_signal_handler(signum, task.cancel)
+
+    try:
+        if args.stdio:
+            await server.serve_stdio()
+        else:
+            await server.serve_unix(args.socket)
+    except asyncio.CancelledError:
+        pass
+    finally:
+        await server.stop()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='drafter render server')
+    parser.add_argument('--socket', default='/tmp/drafter.sock',
+                        help='Unix socket to listen on')
+    parser.add_argument('--stdio', action='store_true',
+                        help='Read requests from stdin, respond on stdout')
+    parser.add_argument('--workers', type=int, default=None,
+                        help='Number of worker processes')
+    parser.add_argument('--memory-limit', type=int, default=None,
+                        help='Replace workers above this many megabytes')
+    parser.add_argument('--max-jobs', type=int, default=None,
+                        help='Replace workers after this many jobs')
+    parser.add_argument('--cache-dir', default=None,
+                        help='Cache the outputs of pages in this directory')
+    parser.add_argument('--cache-size', type=int, default=None,
+                        help='Maximum size of the cache in megabytes')
+    parser.add_argument('--output-dir', default=None,
+                        help='Let jobs write their output in this directory')
+    asyncio.run(serve(parser.parse_args()))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,197 @@
+# template.py
+# Author: Bibek Dahal
+
+import json
+
+from drafter.node import Node
+from drafter.layouts.row import Row
+from drafter.layouts.column import Column
+from drafter.layouts.grid import Grid
+from drafter.nodes.auto_scale import AutoScale
+from drafter.nodes.image import Image
+from drafter.nodes.text import Text
+from drafter.nodes.table import Table, TableColumn
+from drafter.utils.border import Border
+from drafter.utils.field import Field
+from drafter.utils.font import get_font_desc
+from drafter.utils.pos_size import Justify, Align, Position
+from drafter.utils.rect import Rect
+
+
+# Node types which can be used in JSON templates, by name.
+NODE_TYPES = {
+    'Node': Node,
+    'Row': Row,
+    'Column': Column,
+    'Grid': Grid,
+    'AutoScale': AutoScale,
+    'Text': Text,
+    'Table': Table,
+    'Image': Image,
+}
+
+# Where to look up named constants given as strings in JSON templates.
+CONSTANTS = {
+    'justify': Justify,
+    'align': Align,
+    'position': Position,
+    'alignment': Text,
+    'vertical_alignment': Text,
+    'wrap_mode': Text,
+    'font_weight': Text,
+    'header_weight': Text,
+    'mode': Image,
+}
+
+
+class Template:
+    """
+    A node tree defined once and drawn many times with different data.
+
+    Properties of the nodes can be set to a Field placeholder. Everything
+    else is static: sizes and colors are compiled when the nodes are
+    created and font descriptions are resolved when the template is.
+    `bind` then only sets the fields of each record, and leaves untouched
+    the nodes whose values did not change, so that an incremental report
+    drawing the bound tree again only lays out the subtrees that changed.
+    Fields of the columns of a Table are bound too.
+
+    Usage:
+        template = Template(Text(text=Field('name')))
+        report = PngReport(None, 200, 50, incremental=True)
+        for record in records:
+            report.draw_page(template.bind(record), ...)
+    """
+    def __init__(self, root_node):
+        self.root_node = root_node
+        self.bindings = []
+        self.compile()
+
+    def compile(self):
+        """
+        Collect the fields of the tree and resolve the static fonts.
+        """
+        self.bindings = []
+        for node in walk(self.root_node):
+            for key in properties(node):
+                value = getattr(node, key)
+                if isinstance(value, Field):
+                    self.bindings.append((node, key, value, None))
+
+            # Columns are bound on their own, and mark their table as
+            # changed.
+            if isinstance(node, Table) and isinstance(node.columns, list):
+                for column in node.columns:
+                    for key, value in vars(column).items():
+                        if isinstance(value, Field):
+                            self.bindings.append((column, key, value, node))
+
+            if isinstance(node, Text) and not any(
+                isinstance(getattr(node, k), Field)
+                for k in ['font_family', 'font_size', 'font_weight']
+            ):
+                get_font_desc(
+                    node.font_family, node.font_size, node.font_weight
+                )
+
+    def bind(self, record):
+        """
+        Set the fields of the tree from `record` and return the root node.
+        """
+        for target, key, field, table in self.bindings:
+            value = field.resolve(record)
+            if changed(getattr(target, key), value):
+                setattr(target, key, value)
+                if table is not None:
+                    table.columns = table.columns
+        return self.root_node
+
+    @classmethod
+    def from_json(cls, source):
+        """
+        Create a template from a JSON string or an already parsed dict.
+        See `load_node` for the format.
+        """
+        if isinstance(source, (str, bytes)):
+            source = json.loads(source)
+        return cls(load_node(source))
+
+
+def changed(current, value):
+    """
+    Whether a bound property needs to be set to `value`.
+    """
+    if current is value:
+        return False
+    if isinstance(current, Field):
+        return True
+    try:
+        return bool(current != value)
+    except Exception:
+        # Values such as arrays do not compare to a single bool.
+        return True
+
+
+def walk(node):
+    """
+    Iterate over a node and all the nodes below it.
+    """
+    yield node
+    for child in node.children:
+        yield from walk(child)
+
+
+def properties(node):
+    """
+    Names of the properties a node has.
+    """
+    names = set()
+    for klass in type(node).__mro__:
+        names.update(klass.__dict__.get('defaults', {}))
+    return [n for n in names if not n.startswith('_')]
+
+
+def load_value(key, value):
+    """
+    Convert a JSON value of property `key` into what nodes expect.
+    """
+    if isinstance(value, dict) and 'field' in value:
+        return Field(value['field'], value.get('default'))
+    if key in ['margin', 'padding']:
+        return Rect(*value) if isinstance(value, list) else Rect(value)
+    if key == 'border':
+        return Border(**value)
+    if key == 'columns' and value and isinstance(value[0], dict):
+        return [
+            TableColumn(**{k: load_value(k, v) for k, v in c.items()})
+            for c in value
+        ]
+    if key in CONSTANTS and isinstance(value, str):
+        return getattr(CONSTANTS[key], value)
+    return value
+
+
+def load_node(spec):
+    """
+    Create a node tree from a dict like:
+
+        {
+            "type": "Row",
+            "width": "100%",
+            "justify": "SPACE_BETWEEN",
+            "margin": [4, 8],
+            "children": [
+                {"type": "Text", "text": {"field": "customer.name"}}
+            ]
+        }
+
+    `type` is a name of NODE_TYPES, constants are given by name and
+    {"field": name, "default": value} is a Field placeholder.
+    """
+    spec = dict(spec)
+    node_type = NODE_TYPES[spec.pop('type', 'Node')]
+    children = [load_node(c) for c in spec.pop('children', [])]
+    kwargs = {k: load_value(k, v) for k, v in spec.items()}
+    if children:
+        kwargs['children'] = children
+    return node_type(**kwargs)
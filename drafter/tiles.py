@@ -0,0 +1,110 @@
+# tiles.py
+# Author: Bibek Dahal
+
+import math
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+import cairo
+
+from drafter.engine import paint_region
+from drafter.utils.png import PngWriter
+from drafter.utils.surface import surface_array
+
+
+def paint_tile(box, x, y, w, h, scale=1):
+    """
+    Paint the (x, y, w, h) pixel area of a laid out page, drawn at
+    `scale`, on a new ARGB32 surface of size (w, h) and return it.
+    Only the boxes overlapping the tile are painted.
+    """
+    surface = cairo.ImageSurface(cairo.FORMAT_ARGB32, w, h)
+    paint_region(cairo.Context(surface), box, (
+        x / scale, y / scale, w / scale, h / scale,
+    ), scale)
+    surface.flush()
+    return surface
+
+
+def tile_rows(width, height, tile_size):
+    """
+    Return the rows of tiles covering an image, each a list of
+    (x, y, w, h) from left to right.
+    """
+    return [
+        [
+            (x, y, min(tile_size, width - x), min(tile_size, height - y))
+            for x in range(0, width, tile_size)
+        ]
+        for y in range(0, height, tile_size)
+    ]
+
+
+def render_tiles(box, width, height, tile_size=512, scale=1, workers=1):
+    """
+    Paint a laid out page of (width, height) pixels tile by tile and yield
+    a row of ((x, y, w, h), surface) at a time, from top to bottom.
+
+    With more than one worker, the tiles of a row are painted in parallel
+    threads; cairo does not hold the GIL while it rasterizes. Each thread
+    shapes the text it paints with its own font map, see
+    `drafter.nodes.text.layout_cache`. Only one row of tiles is in memory
+    at a time.
+    """
+    rows = tile_rows(width, height, tile_size)
+    if workers == 1:
+        for row in rows:
+            yield [(t, paint_tile(box, *t, scale)) for t in row]
+        return
+
+    with ThreadPoolExecutor(workers) as executor:
+        for row in rows:
+            surfaces = executor.map(lambda t: paint_tile(box, *t, scale), row)
+            yield list(zip(row, surfaces))
+
+
+def write_tiled_png(box, width, height, target, tile_size=512, workers=1,
+                    compression=6):
+    """
+    Write a laid out page as a PNG image, painting it in tiles and
+    encoding each row of tiles as soon as it is painted, so that memory is
+    bounded by a row of tiles instead of the whole page.
+
+    `target` is a filename or a writable file-like object.
+    Requires NumPy.
+    """
+    import numpy as np
+
+    with PngWriter(target, width, height, compression) as png:
+        for row in render_tiles(box, width, height, tile_size, 1, workers):
+            band = np.concatenate(
+                [surface_array(surface) for _, surface in row], axis=1
+            )
+            png.write_pixels(band)
+
+
+def write_tile_pyramid(box, width, height, directory, tile_size=256,
+                       workers=1):
+    """
+    Write a laid out page as a pyramid of PNG tiles, as used by deep zoom
+    viewers, and return the number of levels.
+
+    Level 0 is the page at full size, each following level is half the
+    size of the previous one, down to a level which fits in a single
+    tile. Tile (column, row) of level n is written to
+    `directory/n/column_row.png`. Each level is painted from the layout
+    rather than downscaled from the previous one.
+    """
+    levels = 1 + max(0, math.ceil(math.log2(max(width, height) / tile_size)))
+    for level in range(levels):
+        scale = 1 / 2 ** level
+        w = max(math.ceil(width * scale), 1)
+        h = max(math.ceil(height * scale), 1)
+        path = os.path.join(directory, str(level))
+        os.makedirs(path, exist_ok=True)
+        for row in render_tiles(box, w, h, tile_size, scale, workers):
+            for (x, y, _, _), surface in row:
+                surface.write_to_png(os.path.join(
+                    path, '%d_%d.png' % (x // tile_size, y // tile_size)
+                ))
+    return levels
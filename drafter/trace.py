@@ -0,0 +1,289 @@
+# trace.py
+# Author: Bibek Dahal
+
+import functools
+import json
+from time import perf_counter
+
+from drafter.display_list import DisplayList
+from drafter.node import Node
+
+
+# Traced methods of the nodes and the kind of work they do.
+TRACED_METHODS = [
+    ('layout', 'layout'),
+    ('layout_content', 'measure'),
+    ('measure_content', 'measure'),
+    ('paint', 'paint'),
+    ('record', 'paint'),
+    ('draw_border_and_background', 'draw'),
+    ('record_border_and_background', 'draw'),
+    ('draw_content', 'draw'),
+    ('record_content', 'draw'),
+]
+
+
+def node_classes(klass=Node):
+    """
+    Node and all its subclasses defined so far.
+    """
+    yield klass
+    for subclass in klass.__subclasses__():
+        yield from node_classes(subclass)
+
+
+def node_label(node):
+    """
+    Name of a node in traces: its type, followed by its tag if it has one.
+    """
+    name = type(node).__name__
+    if node.tag is not None and node.tag != 'N/A':
+        return '%s:%s' % (name, node.tag)
+    return name
+
+
+class NodeStats:
+    """
+    Totals of the traced work of the nodes with the same label.
+    Times are in seconds.
+
+    Properties:
+    * layouts: Number of times the nodes were laid out.
+    * reused: Number of those layouts which reused the previous box.
+    * layout_time: Time in layout, including the children.
+    * measure_time: Time measuring the content of the nodes themselves.
+    * paints: Number of times the nodes were painted.
+    * paint_time: Time in paint, including the children, and playing the
+                  drawing operations of the nodes from display lists.
+    * draw_time: Time drawing the background, border and content of the
+                 nodes themselves, including playing their operations.
+    """
+    def __init__(self):
+        self.layouts = 0
+        self.reused = 0
+        self.layout_time = 0
+        self.measure_time = 0
+        self.paints = 0
+        self.paint_time = 0
+        self.draw_time = 0
+
+    @property
+    def self_time(self):
+        return self.measure_time + self.draw_time
+
+    @property
+    def children_time(self):
+        return self.layout_time - self.measure_time + \
+            self.paint_time - self.draw_time
+
+
+class Tracer:
+    """
+    Records the layout and paint work of each node while it is active.
+
+    The methods of the node classes are only wrapped between entering and
+    leaving the tracer, so rendering is not slowed down otherwise. Nodes
+    are grouped by type and `tag`. Only one tracer should be active at a
+    time, and only the thread rendering should use the nodes meanwhile.
+
+    Most of the drawing happens when a display list is played, after the
+    nodes recorded their operations. The time of each operation is
+    counted for the nodes it comes from, split evenly between them when
+    the display list merged the operations of several nodes.
+
+    Usage:
+        with Tracer() as tracer:
+            report.draw_page(root_node)
+        print(tracer.summary())
+        tracer.write_chrome_trace('render.json')
+    """
+    def __init__(self):
+        self.events = []
+        self.stats = {}
+        self._patches = []
+        self._stack = []
+        self._start = None
+
+    def __enter__(self):
+        self._start = perf_counter()
+        DisplayList.tracer = self
+        for klass in node_classes():
+            for name, kind in TRACED_METHODS:
+                if name in klass.__dict__:
+                    function = klass.__dict__[name]
+                    self._patches.append((klass, name, function))
+                    setattr(klass, name, self.wrap(function, kind))
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        for klass, name, function in reversed(self._patches):
+            setattr(klass, name, function)
+        self._patches = []
+        DisplayList.tracer = None
+
+    def wrap(self, function, kind):
+        tracer = self
+
+        @functools.wraps(function)
+        def traced(node, *args, **kwargs):
+            stack = tracer._stack
+            if stack and stack[-1][0] is node and stack[-1][1] == kind:
+                # An override calling the method of its base class.
+                return function(node, *args, **kwargs)
+
+            # Node, kind, own time and time of other nodes inside.
+            frame = [node, kind, 0, 0]
+            stack.append(frame)
+            # The operations added to a display list belong to the node
+            # recording them.
+            display_list = args[0] if kind == 'paint' and args and \
+                isinstance(args[0], DisplayList) else None
+            if display_list is not None:
+                owner = display_list.owner
+                display_list.owner = node
+            start = perf_counter()
+            try:
+                result = function(node, *args, **kwargs)
+            finally:
+                end = perf_counter()
+                stack.pop()
+                if display_list is not None:
+                    display_list.owner = owner
+            tracer.record(frame, start, end, args, kwargs, result)
+            return result
+
+        return traced
+
+    def node_stats(self, node):
+        label = node_label(node)
+        stats = self.stats.get(label)
+        if stats is None:
+            stats = self.stats[label] = NodeStats()
+        return label, stats
+
+    def record(self, frame, start, end, args, kwargs, result):
+        node, kind, own_time, _ = frame
+        label, stats = self.node_stats(node)
+
+        duration = end - start
+        event_args = {}
+        if kind == 'layout':
+            previous = args[3] if len(args) > 3 else kwargs.get('previous')
+            reused = previous is not None and result is previous
+            stats.layouts += 1
+            stats.reused += reused
+            stats.layout_time += duration
+            event_args['reused'] = reused
+        elif kind == 'paint':
+            stats.paints += 1
+            stats.paint_time += duration
+        else:
+            if kind == 'measure':
+                stats.measure_time += duration
+            else:
+                stats.draw_time += duration
+
+        # Count the time of the node itself in its layout or paint.
+        parent = self._stack[-1] if self._stack else None
+        if parent is not None:
+            if parent[0] is node:
+                parent[2] += duration
+            else:
+                parent[3] += duration
+        if kind in ['layout', 'paint']:
+            event_args['self_ms'] = own_time * 1000
+            event_args['children_ms'] = (duration - own_time) * 1000
+
+        self.events.append({
+            'name': label,
+            'cat': kind,
+            'ph': 'X',
+            'ts': (start - self._start) * 1e6,
+            'dur': duration * 1e6,
+            'pid': 0,
+            'tid': 0,
+            'args': event_args,
+        })
+
+    def begin_op(self, nodes):
+        """
+        Start timing an operation of a display list, added by `nodes`.
+        """
+        # Only calls, which have a single node, run traced methods.
+        frame = [nodes[0] if len(nodes) == 1 else None, 'paint', 0, 0,
+                 nodes, perf_counter()]
+        self._stack.append(frame)
+        return frame
+
+    def end_op(self, frame):
+        """
+        Count the time of an operation of a display list for its nodes.
+        Traced methods it ran already counted their own time.
+        """
+        end = perf_counter()
+        self._stack.pop()
+        _, _, own_time, other_time, nodes, start = frame
+        duration = end - start
+        node_time = (duration - other_time) / len(nodes)
+        untraced_time = (duration - other_time - own_time) / len(nodes)
+        for node in nodes:
+            if node is not None:
+                stats = self.node_stats(node)[1]
+                stats.paint_time += node_time
+                stats.draw_time += untraced_time
+
+        self.events.append({
+            'name': node_label(nodes[0]) if len(nodes) == 1 and
+            nodes[0] is not None else 'Batch',
+            'cat': 'play',
+            'ph': 'X',
+            'ts': (start - self._start) * 1e6,
+            'dur': duration * 1e6,
+            'pid': 0,
+            'tid': 0,
+            'args': {'nodes': len(nodes)},
+        })
+
+    def chrome_trace(self):
+        """
+        Return the events as a Chrome trace, which can also be opened with
+        speedscope.
+        """
+        return {
+            'traceEvents': sorted(self.events, key=lambda e: e['ts']),
+            'displayTimeUnit': 'ms',
+        }
+
+    def write_chrome_trace(self, filename):
+        with open(filename, 'w') as f:
+            json.dump(self.chrome_trace(), f)
+
+    def summary(self, limit=None):
+        """
+        Return a table of the traced work by node label, the nodes which
+        took the most time themselves first. Times are in milliseconds.
+        """
+        rows = sorted(
+            self.stats.items(), key=lambda item: -item[1].self_time
+        )[:limit]
+        header = (
+            'Node', 'Layouts', 'Reused', 'Measure', 'Paints', 'Draw',
+            'Children',
+        )
+        lines = [header] + [
+            (
+                label, str(s.layouts), str(s.reused),
+                '%.3f' % (s.measure_time * 1000), str(s.paints),
+                '%.3f' % (s.draw_time * 1000),
+                '%.3f' % (s.children_time * 1000),
+            )
+            for label, s in rows
+        ]
+        widths = [max(len(line[i]) for line in lines) for i in range(7)]
+        return '\n'.join(
+            '  '.join(
+                cell.ljust(width) if i == 0 else cell.rjust(width)
+                for i, (cell, width) in enumerate(zip(line, widths))
+            )
+            for line in lines
+        )
@@ -46,3 +46,14 @@ class Border:
             ctx.stroke_preserve()
         else:
             ctx.stroke()
+
+    def record(self, display_list, x, y, w, h):
+        """
+        Add the stroke of this border to a display list.
+        """
+        if self.width == 0:
+            return
+        display_list.stroke(
+            x, y, w, h, self.radius, self.color, self.width, self.line_dash,
+            self.line_cap,
+        )
@@ -0,0 +1,87 @@
+from drafter.utils.pos_size import Position
+
+
+class Box:
+    """
+    Resolved geometry of a node, produced by the layout phase.
+
+    Properties:
+    * node: The node this box belongs to.
+    * margin: Resolved margin (a Rect with numeric values).
+    * padding: Resolved padding (a Rect with numeric values).
+    * x, y, w, h: Outer rectangle where background and border are drawn.
+    * cx, cy, cw, ch: Inner rectangle after padding, where the content and
+                      the children are drawn.
+    * ox, oy: Offset of the margin rectangle relative to the parent's inner
+              rectangle, as decided by the parent's `arrange`.
+    * children: Boxes of the child nodes.
+    * scale: (sx, sy) applied around (cx, cy) when painting the children,
+             or None.
+    * bounds: (x0, y0, x1, y1) covering everything painted by this box and
+              its children.
+    * inputs: (parent width, parent height, node version) it was laid out
+              for, used to reuse the box in later layouts.
+    * measured: (w, h, cw, ch) before growing to fit the children.
+    * content: What the node decided while measuring its content and needs
+               to paint it, e.g. the rows of a table page, or None.
+    """
+
+    __slots__ = (
+        'node', 'margin', 'padding',
+        'x', 'y', 'w', 'h', 'cx', 'cy', 'cw', 'ch', 'ox', 'oy',
+        'children', 'scale', 'bounds', 'inputs', 'measured', 'content',
+    )
+
+    def __init__(self, node, margin, padding):
+        self.node = node
+        self.margin = margin
+        self.padding = padding
+        self.x, self.y, self.w, self.h = 0, 0, 0, 0
+        self.cx, self.cy, self.cw, self.ch = 0, 0, 0, 0
+        self.ox, self.oy = 0, 0
+        self.children = []
+        self.scale = None
+        self.bounds = None
+        self.inputs = None
+        self.measured = None
+        self.content = None
+
+    @property
+    def dx(self):
+        """
+        Horizontal space taken by this box in its parent's flow.
+        """
+        if self.node.position == Position.ABSOLUTE:
+            return 0
+        return self.w + self.margin.left + self.margin.right
+
+    @property
+    def dy(self):
+        """
+        Vertical space taken by this box in its parent's flow.
+        """
+        if self.node.position == Position.ABSOLUTE:
+            return 0
+        return self.h + self.margin.top + self.margin.bottom
+
+    def walk(self):
+        """
+        Iterate over this box and all the boxes below it, parents first.
+        """
+        yield self
+        for child in self.children:
+            yield from child.walk()
+
+
+def union(a, b):
+    """
+    Smallest (x0, y0, x1, y1) rectangle covering both a and b.
+    """
+    return (min(a[0], b[0]), min(a[1], b[1]), max(a[2], b[2]), max(a[3], b[3]))
+
+
+def intersects(a, b):
+    """
+    Whether two (x0, y0, x1, y1) rectangles overlap.
+    """
+    return a[0] < b[2] and b[0] < a[2] and a[1] < b[3] and b[1] < a[3]
@@ -35,8 +35,46 @@ def hx(hexstr):
     return rgb(*rgb_t)
 
 
+# Parsed colors by their literal, shared by all the nodes.
+COLOR_CACHE_SIZE = 4096
+_color_cache = {}
+
+
+def compile_color(color):
+    """
+    Parse an optional color property once. None stays None.
+    """
+    if color is None:
+        return None
+    return parse_color(color)
+
+
 def parse_color(color):
-    if isinstance(color, list):
+    """
+    Parse a color given as a list of components or as a hex, rgb(a) or
+    hsl(a) string into an (r, g, b, a) tuple.
+
+    Results are memoized, as the same literals are used over and over.
+    """
+    if isinstance(color, str):
+        key = color
+    elif isinstance(color, (list, tuple)):
+        key = tuple(color)
+    else:
+        raise Exception(f'Invalid color: {color}')
+
+    parsed = _color_cache.get(key)
+    if parsed is None:
+        parsed = tuple(_parse_color(color))
+        # Keep the cache bounded when colors are generated on the fly.
+        if len(_color_cache) >= COLOR_CACHE_SIZE:
+            _color_cache.clear()
+        _color_cache[key] = parsed
+    return parsed
+
+
+def _parse_color(color):
+    if isinstance(color, (list, tuple)):
         if len(color) == 3:
             return [*color, 1]
         if len(color) != 4:
@@ -44,7 +82,7 @@ def parse_color(color):
         return color
 
     if isinstance(color, str):
-        if color[0] == '#' and len(color) == 7 or len(color) == 4:
+        if color[0] == '#' and len(color) in [4, 7]:
             return hx(color)
         elif color[:4] == 'rgb(' and color[-1] == ')':
             return rgb(*[
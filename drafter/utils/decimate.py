@@ -0,0 +1,69 @@
+import numpy as np
+
+
+def finite(x, y):
+    """
+    Drop the points where x or y is NaN or infinite.
+    """
+    mask = np.isfinite(x) & np.isfinite(y)
+    if mask.all():
+        return x, y
+    return x[mask], y[mask]
+
+
+def min_max(px, py):
+    """
+    Reduce a series, already in pixel coordinates and sorted by x, to at
+    most four points per pixel column: the first, lowest, highest and last
+    point of the column. The line drawn through them covers the same
+    pixels as the full series.
+    """
+    n = len(px)
+    columns = np.floor(px)
+    if n <= 4 or n <= 4 * (columns[-1] - columns[0] + 1):
+        return px, py
+
+    starts = np.concatenate(([0], np.flatnonzero(np.diff(columns)) + 1))
+    ends = np.concatenate((starts[1:], [n])) - 1
+    lows = np.minimum.reduceat(py, starts)
+    highs = np.maximum.reduceat(py, starts)
+
+    # Lowest and highest are drawn as a vertical line at the column.
+    out_x = np.stack([px[starts], px[starts], px[starts], px[ends]], axis=1)
+    out_y = np.stack([py[starts], lows, highs, py[ends]], axis=1)
+    return out_x.ravel(), out_y.ravel()
+
+
+def lttb(x, y, threshold):
+    """
+    Reduce a series sorted by x to `threshold` points with the
+    Largest-Triangle-Three-Buckets algorithm, which keeps the points that
+    shape the line the most.
+    """
+    n = len(x)
+    if threshold >= n or threshold < 3:
+        return x, y
+
+    # n - 2 inner points in threshold - 2 buckets; first and last are kept.
+    edges = np.linspace(1, n - 1, threshold - 1).astype(int)
+    indices = np.empty(threshold, dtype=int)
+    indices[0], indices[-1] = 0, n - 1
+
+    selected = 0
+    for i in range(threshold - 2):
+        start, end = edges[i], edges[i + 1]
+        if i + 2 < len(edges):
+            following = slice(edges[i + 1], edges[i + 2])
+            avg_x, avg_y = x[following].mean(), y[following].mean()
+        else:
+            avg_x, avg_y = x[-1], y[-1]
+
+        ax, ay = x[selected], y[selected]
+        areas = np.abs(
+            (ax - avg_x) * (y[start:end] - ay) -
+            (ax - x[start:end]) * (avg_y - ay)
+        )
+        selected = start + int(areas.argmax())
+        indices[i + 1] = selected
+
+    return x[indices], y[indices]
@@ -0,0 +1,33 @@
+
+class Field:
+    """
+    Placeholder for a property value which is bound later from a record,
+    see `drafter.template.Template`.
+
+    Properties:
+    * name: Key of the value in the record. Dots access nested values,
+            as in 'customer.name'.
+    * default: Value used when the record does not have the key.
+    * format: Optional function applied to the value.
+    """
+    def __init__(self, name, default=None, format=None):
+        self.name = name
+        self.default = default
+        self.format = format
+
+    def resolve(self, record):
+        value = record
+        for part in self.name.split('.'):
+            try:
+                value = value[part]
+            except (KeyError, IndexError, TypeError):
+                try:
+                    value = getattr(value, part)
+                except AttributeError:
+                    return self.default
+        if self.format is not None:
+            value = self.format(value)
+        return value
+
+    def __repr__(self):
+        return f'Field({self.name!r})'
@@ -1,26 +1,160 @@
-import gi
-gi.require_version('Pango', '1.0')  # noqa
-gi.require_version('PangoCairo', '1.0')  # noqa
-from gi.repository import Pango, PangoCairo
+import cairo
 
+from drafter.utils.pango import load_pango
 
-def get_font_desc(font_family, font_size, font_weight):
+
+# Index of the installed fonts, built once per process:
+# [(lowercase family name, {(weight, style): face description})]
+# in the order given by the font map.
+_font_index = None
+
+# Resolved family names by the requested (lowercase) family name.
+_family_cache = {}
+
+# Font descriptions by (family, size, weight).
+_font_desc_cache = {}
+
+
+def build_font_index():
+    """
+    Enumerate the families of the default font map along with the
+    description of each of their faces.
+    """
+    Pango, PangoCairo = load_pango()
     font_map = PangoCairo.font_map_get_default()
-    desc = next((
-        v.list_faces()[0].describe() for v in font_map.list_families()
-        if font_family.lower() in v.get_name().lower()
-    ), None)  # TODO Default font
+    index = []
+    for family in font_map.list_families():
+        faces = {}
+        for face in family.list_faces():
+            desc = face.describe()
+            key = (int(desc.get_weight()), int(desc.get_style()))
+            faces.setdefault(key, desc)
+        index.append((family.get_name().lower(), faces))
+    return index
+
+
+def get_font_index():
+    """
+    Return the font index, building it on first use.
+    """
+    global _font_index
+    if _font_index is None:
+        _font_index = build_font_index()
+    return _font_index
+
+
+def find_family(font_family):
+    """
+    Return the index entry (name, faces) of the family matching
+    `font_family`, or None.
+
+    An exact match is preferred, otherwise the first family whose name
+    contains the requested one is used.
+    """
+    name = font_family.lower()
+    if name in _family_cache:
+        return _family_cache[name]
+
+    index = get_font_index()
+    entry = next((e for e in index if e[0] == name), None)
+    if entry is None:
+        entry = next((e for e in index if name in e[0]), None)
+
+    _family_cache[name] = entry
+    return entry
+
 
-    if desc is None:
+def find_face(font_family, weight=None, style=None):
+    """
+    Return a copy of the description of the face of `font_family` with
+    the closest weight and the given style, or None if there is no such
+    family.
+    """
+    entry = find_family(font_family)
+    if entry is None or not entry[1]:
         return None
 
-    desc.set_style(Pango.Style.NORMAL)
-    desc.set_weight(Pango.Weight.NORMAL)
+    Pango = load_pango()[0]
+    faces = entry[1]
+    weight = int(Pango.Weight.NORMAL if weight is None else weight)
+    style = int(Pango.Style.NORMAL if style is None else style)
 
-    if font_size is not None:
-        desc.set_size(font_size * Pango.SCALE)
+    candidates = [k for k in faces if k[1] == style] or list(faces)
+    key = min(candidates, key=lambda k: abs(k[0] - weight))
+    return faces[key].copy()
 
-    if font_weight is not None:
-        desc.set_weight(font_weight)
 
+def get_font_desc(font_family, font_size, font_weight):
+    """
+    Return the font description for the given family, size and weight,
+    based on the upright face of the family with the closest weight.
+    The requested weight is kept, so that Pango synthesizes it when the
+    family has no such face, e.g. bold text of a family with only a
+    regular face.
+
+    Descriptions are memoized, so the returned object is shared and must
+    not be modified.
+    """
+    key = (font_family, font_size, font_weight)
+    if key in _font_desc_cache:
+        return _font_desc_cache[key]
+
+    desc = find_face(font_family, font_weight)  # TODO Default font
+    if desc is not None:
+        Pango = load_pango()[0]
+        if font_weight is not None:
+            desc.set_weight(Pango.Weight(int(font_weight)))
+        desc.set_style(Pango.Style.NORMAL)
+        if font_size is not None:
+            desc.set_size(int(font_size * Pango.SCALE))
+
+    _font_desc_cache[key] = desc
     return desc
+
+
+def invalidate_font_cache():
+    """
+    Forget the font index, all resolved font descriptions and the text
+    layouts shaped with them, for example after installing new fonts.
+    """
+    from drafter.nodes.text import layout_cache
+
+    global _font_index
+    _font_index = None
+    _family_cache.clear()
+    _font_desc_cache.clear()
+    layout_cache.clear()
+
+
+def warmup(fonts=()):
+    """
+    Load Pango, the font map and the fontconfig caches ahead of time,
+    typically at worker start, by building the font index and shaping a
+    sample text.
+
+    `fonts` is an optional list of (family, size, weight) to resolve
+    and shape in advance.
+    """
+    PangoCairo = load_pango()[1]
+    get_font_index()
+
+    ctx = cairo.Context(cairo.ImageSurface(cairo.FORMAT_ARGB32, 1, 1))
+    layout = PangoCairo.create_layout(ctx)
+    for font in fonts or [None]:
+        layout.set_font_description(get_font_desc(*font) if font else None)
+        layout.set_text('Warm up 0123456789', -1)
+        layout.get_extents()
+
+
+def font_options_key(ctx):
+    """
+    Return a hashable summary of the font options of the surface behind
+    `ctx`. Text shaped with equal options has the same metrics.
+    """
+    options = ctx.get_target().get_font_options()
+    return (
+        int(options.get_antialias()),
+        int(options.get_hint_style()),
+        int(options.get_hint_metrics()),
+        int(options.get_subpixel_order()),
+    )
@@ -0,0 +1,241 @@
+import functools
+import hashlib
+import struct
+import sys
+import types
+
+
+class Uncacheable(Exception):
+    """
+    Raised when a tree holds something whose output can not be known from
+    its value, such as a dynamic canvas.
+    """
+
+
+def layout_outputs(klass):
+    names = set()
+    for base in klass.__mro__:
+        names.update(base.__dict__.get('layout_outputs', ()))
+    return names
+
+
+def property_names(klass):
+    """
+    Names of the public properties of a node class, from the `defaults` and
+    the slots of its classes, except those set by the layout itself.
+    Attributes kept in the dict of an instance are added by `add_node`.
+    """
+    names = set()
+    for base in klass.__mro__:
+        names.update(base.__dict__.get('defaults', {}))
+        slots = base.__dict__.get('__slots__', ())
+        names.update((slots,) if isinstance(slots, str) else slots)
+    names -= layout_outputs(klass)
+    return sorted(
+        n for n in names if not n.startswith('_') and n != 'children'
+    )
+
+
+class TreeHasher:
+    """
+    Computes a digest of a node tree which only depends on its structure
+    and values, so it is the same in every process and for equal trees
+    built separately.
+    """
+    def __init__(self):
+        self.digest = hashlib.blake2b(digest_size=20)
+        self._property_names = {}
+        # Functions and objects being hashed, to stop at cycles.
+        self._active = set()
+
+    def write(self, *parts):
+        for part in parts:
+            if isinstance(part, str):
+                part = part.encode()
+            self.digest.update(struct.pack('<Q', len(part)))
+            self.digest.update(part)
+
+    def add_node(self, node):
+        klass = type(node)
+        names = self._property_names.get(klass)
+        if names is None:
+            names = self._property_names[klass] = property_names(klass)
+
+        # Properties of subclasses which do not declare slots, e.g. a class
+        # attribute overridden in the constructor, live in the dict.
+        state = getattr(node, '__dict__', None)
+        if state:
+            names = sorted(set(names).union(
+                name for name in state if not name.startswith('_')
+            ) - layout_outputs(klass))
+
+        self.write('node', klass.__module__, klass.__qualname__)
+        if getattr(node, 'dynamic', False):
+            raise Uncacheable('%s draws something different each time'
+                              % klass.__name__)
+        for name in names:
+            value = getattr(node, name, Uncacheable)
+            if value is Uncacheable:
+                # A slot without a default which was never set.
+                self.write('unset', name)
+                continue
+            if isinstance(value, types.MethodType) and value.__self__ is node:
+                # A method of the node class, e.g. a chart's callback.
+                value = value.__func__
+            self.write(name)
+            self.add(value)
+
+        extra = node.cache_key()
+        if extra is not None:
+            self.write('key')
+            self.add(extra)
+
+        self.write('children', str(len(node.children)))
+        for child in node.children:
+            self.add_node(child)
+
+    def add(self, value):
+        if value is None or isinstance(value, (bool, int, float, complex)):
+            self.write(type(value).__name__, repr(value))
+        elif isinstance(value, str):
+            self.write('str', value)
+        elif isinstance(value, (bytes, bytearray, memoryview)):
+            self.write('bytes', bytes(value))
+        elif isinstance(value, (list, tuple, range)):
+            self.write(type(value).__name__, str(len(value)))
+            for item in value:
+                self.add(item)
+        elif isinstance(value, dict):
+            self.write('dict', str(len(value)))
+            for key in sorted(value, key=repr):
+                self.add(key)
+                self.add(value[key])
+        elif isinstance(value, (set, frozenset)):
+            self.write('set', str(len(value)))
+            for item in sorted(value, key=repr):
+                self.add(item)
+        elif isinstance(value, (types.FunctionType, types.BuiltinFunctionType,
+                                types.MethodType)):
+            self.add_function(value)
+        elif isinstance(value, functools.partial):
+            self.write('partial')
+            self.add([value.func, value.args, value.keywords])
+        elif isinstance(value, types.ModuleType):
+            self.write('module', value.__name__)
+        elif isinstance(value, type):
+            self.write('type', value.__module__, value.__qualname__)
+        elif type(value).__module__ == 'numpy':
+            self.add_array(value)
+        elif type(value).__module__ == 'cairo' and hasattr(value, 'get_data'):
+            self.add_surface(value)
+        else:
+            self.add_object(value)
+
+    def add_array(self, value):
+        np = sys.modules['numpy']
+        value = np.ascontiguousarray(value)
+        self.write('array', str(value.dtype), repr(value.shape))
+        if value.dtype.hasobject:
+            self.add(value.tolist())
+        else:
+            self.write(memoryview(value).cast('B'))
+
+    def add_surface(self, surface):
+        surface.flush()
+        self.write(
+            'surface', repr(surface.get_format()),
+            '%d %d %d' % (surface.get_width(), surface.get_height(),
+                          surface.get_stride()),
+            bytes(surface.get_data()),
+        )
+
+    def add_function(self, function):
+        """
+        Functions are identified by their name and, when they are defined
+        in Python, by their code, the names it uses and the values it
+        reads: defaults, closed over variables and globals.
+        """
+        if isinstance(function, types.MethodType):
+            self.write('method')
+            self.add(function.__self__)
+            function = function.__func__
+
+        self.write(
+            'function', getattr(function, '__module__', None) or '',
+            getattr(function, '__qualname__', None) or repr(function),
+        )
+        code = getattr(function, '__code__', None)
+        if code is None or id(function) in self._active:
+            return
+        self._active.add(id(function))
+        names = set()
+        self.add_code(code, names)
+        self.add(function.__defaults__)
+        self.add(function.__kwdefaults__)
+        for cell in function.__closure__ or ():
+            self.add(cell.cell_contents)
+
+        # Names are those of globals and attributes alike; the values of
+        # the globals are hashed, the rest are builtins or attributes.
+        function_globals = getattr(function, '__globals__', {})
+        for name in sorted(names):
+            if name in function_globals:
+                self.write('global', name)
+                self.add(function_globals[name])
+        self._active.discard(id(function))
+
+    def add_code(self, code, names):
+        self.write('code', code.co_code)
+        self.add(code.co_names)
+        names.update(code.co_names)
+        for const in code.co_consts:
+            if isinstance(const, types.CodeType):
+                self.add_code(const, names)
+            else:
+                self.add(const)
+
+    def add_object(self, value):
+        klass = type(value)
+        if hasattr(klass, 'defaults') and hasattr(value, 'children'):
+            self.add_node(value)
+            return
+
+        self.write('object', klass.__module__, klass.__qualname__)
+        state = getattr(value, '__dict__', None)
+        if state is None and hasattr(klass, '__slots__'):
+            state = {
+                name: getattr(value, name)
+                for base in klass.__mro__
+                for name in getattr(base, '__slots__', ())
+                if not name.startswith('__') and hasattr(value, name)
+            }
+        if state is None:
+            # Only values with a repr that stands for their content.
+            text = repr(value)
+            if ' at 0x' in text:
+                raise Uncacheable('Can not hash %s' % text)
+            self.write(text)
+            return
+
+        if id(value) in self._active:
+            self.write('cycle')
+            return
+        self._active.add(id(value))
+        self.add(state)
+        self._active.discard(id(value))
+
+
+def tree_hash(root_node, *extra):
+    """
+    Return a hex digest of a node tree: the type and all the properties of
+    every node, including the text, data and the code of callbacks,
+    together with `extra` values such as the size and format of the
+    output. Raise Uncacheable when the tree can not be hashed.
+
+    Like the layout, the hash only sees what the properties hold when it
+    is computed: content mutated in place is hashed as it is now.
+    """
+    hasher = TreeHasher()
+    hasher.add(list(extra))
+    hasher.add_node(root_node)
+    return hasher.digest.hexdigest()
@@ -0,0 +1,106 @@
+import hashlib
+import io
+import os
+
+import cairo
+
+from drafter.utils.lru import LRUCache
+
+
+# Decoded images and their scaled variants, shared by all the Image nodes
+# of the process and kept across renders. Both are limited by the memory
+# of their pixels; set `maxweight` (in bytes) to change the limits.
+image_cache = LRUCache(256, maxweight=64 * 1024 * 1024)
+scaled_cache = LRUCache(1024, maxweight=64 * 1024 * 1024)
+
+# Lets the PDF backend embed an image once, however many times it is
+# painted. Only available with cairo >= 1.12.
+MIME_TYPE_UNIQUE_ID = getattr(cairo, 'MIME_TYPE_UNIQUE_ID', None)
+
+# Surfaces which keep the image data as it is and scale it on output.
+VECTOR_SURFACES = [
+    getattr(cairo, 'SURFACE_TYPE_' + name)
+    for name in ['PDF', 'PS', 'SVG', 'RECORDING', 'SCRIPT']
+    if hasattr(cairo, 'SURFACE_TYPE_' + name)
+]
+
+
+def surface_weight(surface):
+    """
+    Number of bytes of pixel data held by an image surface.
+    """
+    return surface.get_stride() * surface.get_height()
+
+
+def image_key(source):
+    """
+    Key identifying the content of an image source: a PNG filename, PNG
+    data as bytes or a cairo ImageSurface.
+
+    Files are identified by their path, modification time and size, so a
+    changed file is loaded again.
+    """
+    if isinstance(source, cairo.ImageSurface):
+        return source
+    if isinstance(source, (bytes, bytearray, memoryview)):
+        return ('data', hashlib.sha1(source).hexdigest())
+    path = os.path.abspath(os.fspath(source))
+    stat = os.stat(path)
+    return ('file', path, stat.st_mtime_ns, stat.st_size)
+
+
+def load_image(source):
+    """
+    Return the key and the decoded ImageSurface of an image source,
+    decoding it only if it is not in `image_cache`.
+    """
+    key = image_key(source)
+    if isinstance(source, cairo.ImageSurface):
+        return key, source
+
+    surface = image_cache.get(key)
+    if surface is None:
+        if key[0] == 'data':
+            surface = cairo.ImageSurface.create_from_png(
+                io.BytesIO(bytes(source))
+            )
+        else:
+            surface = cairo.ImageSurface.create_from_png(key[1])
+
+        if MIME_TYPE_UNIQUE_ID is not None:
+            unique_id = hashlib.sha1(repr(key).encode()).hexdigest()
+            surface.set_mime_data(MIME_TYPE_UNIQUE_ID, unique_id.encode())
+        image_cache.put(key, surface, surface_weight(surface))
+    return key, surface
+
+
+def scaled_image(key, surface, width, height):
+    """
+    Return the image `surface` resampled to (width, height) pixels, from
+    `scaled_cache` when it was already scaled to that size.
+    """
+    if (width, height) == (surface.get_width(), surface.get_height()):
+        return surface
+
+    scaled_key = (key, width, height)
+    scaled = scaled_cache.get(scaled_key)
+    if scaled is None:
+        scaled = cairo.ImageSurface(cairo.FORMAT_ARGB32, width, height)
+        ctx = cairo.Context(scaled)
+        ctx.scale(width / surface.get_width(), height / surface.get_height())
+        ctx.set_source_surface(surface, 0, 0)
+        pattern = ctx.get_source()
+        pattern.set_filter(cairo.FILTER_GOOD)
+        pattern.set_extend(cairo.EXTEND_PAD)
+        ctx.paint()
+        scaled.flush()
+        scaled_cache.put(scaled_key, scaled, surface_weight(scaled))
+    return scaled
+
+
+def clear_image_caches():
+    """
+    Drop all the decoded and scaled images.
+    """
+    image_cache.clear()
+    scaled_cache.clear()
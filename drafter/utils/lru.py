@@ -0,0 +1,89 @@
+from collections import OrderedDict
+from threading import Lock
+
+
+class LRUCache:
+    """
+    A bounded mapping which evicts the least recently used entries.
+
+    Properties:
+    * maxsize: Maximum number of entries kept.
+    * maxweight: Maximum total weight of the entries, e.g. in bytes, or
+                 None for no limit. Each entry has the weight given to
+                 `put`.
+    * weight: Current total weight of the entries.
+    * hits: Number of successful lookups.
+    * misses: Number of failed lookups.
+    """
+
+    def __init__(self, maxsize=1024, maxweight=None):
+        self.maxsize = maxsize
+        self.maxweight = maxweight
+        self.weight = 0
+        self.hits = 0
+        self.misses = 0
+        self._data = OrderedDict()
+        self._weights = {}
+        self._lock = Lock()
+
+    def __len__(self):
+        return len(self._data)
+
+    def __contains__(self, key):
+        return key in self._data
+
+    def get(self, key, default=None):
+        with self._lock:
+            try:
+                value = self._data[key]
+            except KeyError:
+                self.misses += 1
+                return default
+            self._data.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def peek(self, key, default=None):
+        """
+        Return the value for `key` without counting the lookup or
+        refreshing the entry.
+        """
+        return self._data.get(key, default)
+
+    def put(self, key, value, weight=1):
+        with self._lock:
+            self.weight += weight - self._weights.get(key, 0)
+            self._data[key] = value
+            self._weights[key] = weight
+            self._data.move_to_end(key)
+            self._evict()
+
+    def _evict(self):
+        # The entry just put is kept even if it alone is over the limit.
+        while len(self._data) > self.maxsize or (
+            self.maxweight is not None and self.weight > self.maxweight and
+            len(self._data) > 1
+        ):
+            key, _ = self._data.popitem(last=False)
+            self.weight -= self._weights.pop(key)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+            self._weights.clear()
+            self.weight = 0
+            self.hits = 0
+            self.misses = 0
+
+    def stats(self):
+        """
+        Return the counters of this cache as a dict.
+        """
+        return {
+            'size': len(self._data),
+            'maxsize': self.maxsize,
+            'weight': self.weight,
+            'maxweight': self.maxweight,
+            'hits': self.hits,
+            'misses': self.misses,
+        }
@@ -0,0 +1,18 @@
+# Pango and PangoCairo, imported through GObject introspection on first
+# use rather than when drafter is imported, since loading them takes much
+# longer than anything else at startup.
+_modules = None
+
+
+def load_pango():
+    """
+    Return the (Pango, PangoCairo) modules, importing them if needed.
+    """
+    global _modules
+    if _modules is None:
+        import gi
+        gi.require_version('Pango', '1.0')  # noqa
+        gi.require_version('PangoCairo', '1.0')  # noqa
+        from gi.repository import Pango, PangoCairo
+        _modules = (Pango, PangoCairo)
+    return _modules
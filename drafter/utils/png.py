@@ -0,0 +1,108 @@
+import struct
+import sys
+import zlib
+
+
+PNG_SIGNATURE = b'\x89PNG\r\n\x1a\n'
+
+
+def chunk(tag, data):
+    """
+    Encode a PNG chunk.
+    """
+    return struct.pack('>I', len(data)) + tag + data + struct.pack(
+        '>I', zlib.crc32(tag + data) & 0xffffffff
+    )
+
+
+def unpremultiply(pixels):
+    """
+    Convert the pixels of an ARGB32 surface, as viewed by `surface_array`,
+    into straight RGBA bytes as stored in PNG files.
+    """
+    import numpy as np
+
+    if sys.byteorder == 'little':
+        b, g, r, a = [pixels[..., i] for i in range(4)]
+    else:
+        a, r, g, b = [pixels[..., i] for i in range(4)]
+
+    alpha = a.astype(np.uint16)
+    divisor = np.maximum(alpha, 1)
+    rgba = np.empty(pixels.shape, dtype=np.uint8)
+    for i, channel in enumerate([r, g, b]):
+        value = (channel.astype(np.uint16) * 255 + divisor // 2) // divisor
+        rgba[..., i] = np.where(alpha > 0, value, 0)
+    rgba[..., 3] = a
+    return rgba
+
+
+class PngWriter:
+    """
+    Writes a PNG image band by band, so that the whole image never needs
+    to be in memory.
+
+    Rows are given top to bottom as ARGB32 surfaces (or arrays viewing
+    them) as wide as the image. Requires NumPy.
+
+    Usage:
+        with PngWriter('poster.png', width, height) as png:
+            for band in bands:
+                png.write_surface(band)
+    """
+    def __init__(self, target, width, height, compression=6):
+        self.width = width
+        self.height = height
+        self.rows = 0
+        self._owns_stream = not hasattr(target, 'write')
+        self.stream = open(target, 'wb') if self._owns_stream else target
+        self._compressor = zlib.compressobj(compression)
+
+        # 8 bit RGBA, not interlaced.
+        self.stream.write(PNG_SIGNATURE)
+        self.stream.write(chunk(b'IHDR', struct.pack(
+            '>IIBBBBB', width, height, 8, 6, 0, 0, 0
+        )))
+
+    def write_surface(self, surface):
+        from drafter.utils.surface import surface_array
+        self.write_pixels(surface_array(surface))
+
+    def write_pixels(self, pixels):
+        """
+        Append rows of ARGB32 pixels of shape (rows, width, 4).
+        """
+        import numpy as np
+
+        rows = pixels.shape[0]
+        if pixels.shape[1] != self.width or self.rows + rows > self.height:
+            raise Exception('Rows do not fit in the PNG image')
+
+        # Each row starts with its filter type, none here.
+        data = np.zeros((rows, self.width * 4 + 1), dtype=np.uint8)
+        data[:, 1:] = unpremultiply(pixels).reshape(rows, self.width * 4)
+        self._write_data(self._compressor.compress(data.tobytes()))
+        self.rows += rows
+
+    def _write_data(self, data):
+        if data:
+            self.stream.write(chunk(b'IDAT', data))
+
+    def close(self):
+        if self.rows != self.height:
+            raise Exception(
+                'PNG image has %d of %d rows' % (self.rows, self.height)
+            )
+        self._write_data(self._compressor.flush())
+        self.stream.write(chunk(b'IEND', b''))
+        if self._owns_stream:
+            self.stream.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is None:
+            self.close()
+        elif self._owns_stream:
+            self.stream.close()
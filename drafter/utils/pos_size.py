@@ -20,6 +20,33 @@ class Position:
     RELATIVE = 2
 
 
+def justify_offsets(justify, free, count):
+    """
+    Return the (start, spacing) to distribute `free` space around `count`
+    items according to `justify`.
+    """
+    if justify == Justify.SPACE_BETWEEN:
+        return 0, (free / (count - 1) if count > 1 else 0)
+    if justify == Justify.SPACE_AROUND:
+        spacing = free / (count + 1)
+        return spacing, spacing
+    if justify == Justify.END:
+        return free, 0
+    return 0, 0
+
+
+def align_offset(align, free):
+    """
+    Return the offset of an item in `free` extra space according to
+    `align`.
+    """
+    if align == Align.CENTER:
+        return free / 2
+    if align == Align.END:
+        return free
+    return 0
+
+
 def calc_size(parent_size, size, default_size=0):
     if parent_size is None:
         parent_size = 0
@@ -39,3 +66,81 @@ def calc_rect_size(parent_w, parent_h, size, default_size=0):
         calc_size(parent_h, size.bottom, default_size),
         calc_size(parent_w, size.left, default_size)
     )
+
+
+def is_relative(size):
+    """
+    Whether the size is a percentage of the parent size.
+    """
+    return isinstance(size, str) and size[-1] == '%'
+
+
+# Compiled sizes by their literal, so that nodes share them.
+SIZE_CACHE_SIZE = 4096
+_size_cache = {}
+
+
+def compile_size(size):
+    """
+    Parse a size once into a (fixed, ratio) pair, so that the size for any
+    parent size is `fixed + ratio * parent_size`. None is zero.
+    """
+    compiled = _size_cache.get(size)
+    if compiled is not None:
+        return compiled
+
+    if size is None:
+        compiled = (0, 0)
+    elif is_relative(size):
+        compiled = (0, float(size[:-1]) / 100)
+    else:
+        compiled = (float(size), 0)
+
+    if len(_size_cache) >= SIZE_CACHE_SIZE:
+        _size_cache.clear()
+    _size_cache[size] = compiled
+    return compiled
+
+
+def resolve_size(parent_size, size):
+    """
+    Resolve a size compiled by `compile_size`.
+    """
+    fixed, ratio = size
+    if ratio:
+        return fixed + ratio * (parent_size or 0)
+    return fixed
+
+
+def compile_rect(rect):
+    """
+    Parse the sides of a Rect once.
+
+    When no side is a percentage, the result is a Rect of numbers which can
+    be shared as it is (the same Rect, if it already holds numbers).
+    Otherwise, it is a tuple of compiled sizes for (top, right, bottom,
+    left).
+    """
+    sides = (rect.top, rect.right, rect.bottom, rect.left)
+    if all(isinstance(s, (int, float)) for s in sides):
+        return rect
+    if not any(is_relative(s) for s in sides):
+        return Rect(*[compile_size(s)[0] for s in sides])
+    return tuple(compile_size(s) for s in sides)
+
+
+def resolve_rect(parent_w, parent_h, rect):
+    """
+    Resolve a Rect compiled by `compile_rect`.
+    Vertical sides are relative to the parent height and horizontal sides
+    to the parent width.
+    """
+    if isinstance(rect, Rect):
+        return rect
+    top, right, bottom, left = rect
+    return Rect(
+        resolve_size(parent_h, top),
+        resolve_size(parent_w, right),
+        resolve_size(parent_h, bottom),
+        resolve_size(parent_w, left),
+    )
@@ -8,7 +8,7 @@ class Rect:
             self.right, self.left = right, right
         elif left is None:
             self.top = top
-            self.right, self.left = left, left
+            self.right, self.left = right, right
             self.bottom = bottom
         else:
             self.top = top
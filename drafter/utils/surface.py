@@ -0,0 +1,31 @@
+import cairo
+
+
+def surface_array(surface):
+    """
+    Return a NumPy array of shape (height, width, 4) viewing the pixel data
+    of an ARGB32 ImageSurface, without copying it.
+
+    The channels are in the native byte order of cairo's 32 bit pixels,
+    i.e. (B, G, R, A) on little-endian machines, with premultiplied alpha.
+    Rows are addressed with the surface stride, so any padding at the end
+    of the rows is skipped. The array keeps the surface alive.
+
+    Requires NumPy.
+    """
+    try:
+        import numpy as np
+    except ImportError:
+        raise ImportError('NumPy is required to get the surface as an array')
+
+    if surface.get_format() != cairo.FORMAT_ARGB32:
+        raise Exception('Only ARGB32 surfaces can be viewed as arrays')
+
+    surface.flush()
+    width, height = surface.get_width(), surface.get_height()
+    return np.ndarray(
+        shape=(height, width, 4),
+        dtype=np.uint8,
+        buffer=surface.get_data(),
+        strides=(surface.get_stride(), 4, 1),
+    )
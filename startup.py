@@ -0,0 +1,56 @@
+# startup.py
+# Author: Bibek Dahal
+#
+# Measures how long a fresh interpreter takes to import drafter and the
+# modules needed to draw a report, and checks it against a budget.
+# Pango must not be loaded by the imports alone.
+# Usage: python startup.py [budget in ms] [runs]
+
+import subprocess
+import sys
+
+
+MODULES = [
+    'drafter',
+    'drafter.report',
+    'drafter.layouts.row',
+    'drafter.layouts.column',
+    'drafter.nodes.text',
+    'drafter.nodes.table',
+]
+
+SCRIPT = f'''
+import sys, time
+start = time.perf_counter()
+import {', '.join(MODULES)}
+elapsed = time.perf_counter() - start
+print(elapsed, 'gi' in sys.modules)
+'''
+
+
+def measure(runs):
+    """
+    Return the best import time in seconds over `runs` fresh interpreters
+    and whether gi was imported.
+    """
+    times = []
+    for _ in range(runs):
+        output = subprocess.check_output([sys.executable, '-c', SCRIPT])
+        elapsed, gi_loaded = output.decode().split()
+        times.append(float(elapsed))
+    return min(times), gi_loaded == 'True'
+
+
+def main():
+    budget = float(sys.argv[1]) if len(sys.argv) > 1 else 50
+    runs = int(sys.argv[2]) if len(sys.argv) > 2 else 5
+
+    elapsed, gi_loaded = measure(runs)
+    print(f'import time:  {elapsed * 1000:.1f} ms (budget {budget:.0f} ms)')
+    print(f'pango loaded: {gi_loaded}')
+    if elapsed * 1000 > budget or gi_loaded:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,50 @@
+import numpy as np
+
+from drafter.utils.decimate import finite, min_max, lttb
+
+
+def test_finite_drops_nan_and_infinite_points():
+    x = np.array([0., 1., 2., 3.])
+    y = np.array([1., np.nan, np.inf, 4.])
+    fx, fy = finite(x, y)
+    assert fx.tolist() == [0., 3.]
+    assert fy.tolist() == [1., 4.]
+
+
+def test_min_max_keeps_short_series():
+    px = np.array([0., 0.5, 1.5])
+    py = np.array([3., 1., 2.])
+    out_x, out_y = min_max(px, py)
+    assert out_x is px and out_y is py
+
+
+def test_min_max_keeps_first_low_high_and_last_of_each_column():
+    px = np.array([0., .2, .4, .6, .8, 1., 1.2, 1.4, 1.6, 1.8])
+    py = np.array([5., 1., 9., 3., 4., 2., 8., 0., 7., 6.])
+    out_x, out_y = min_max(px, py)
+    assert out_x.tolist() == [0., 0., 0., .8, 1., 1., 1., 1.8]
+    assert out_y.tolist() == [5., 1., 9., 4., 2., 0., 8., 6.]
+
+
+def test_lttb_keeps_short_series():
+    x = np.arange(5.)
+    y = np.arange(5.)
+    out_x, out_y = lttb(x, y, 10)
+    assert out_x is x and out_y is y
+
+
+def test_lttb_keeps_the_ends_and_the_peak():
+    x = np.arange(10.)
+    y = np.zeros(10)
+    y[5] = 10
+    out_x, out_y = lttb(x, y, 3)
+    assert out_x.tolist() == [0., 5., 9.]
+    assert out_y.tolist() == [0., 10., 0.]
+
+
+def test_lttb_returns_threshold_points_in_order():
+    x = np.arange(1000.)
+    y = np.sin(x / 50)
+    out_x, _ = lttb(x, y, 100)
+    assert len(out_x) == 100
+    assert (np.diff(out_x) > 0).all()
@@ -0,0 +1,154 @@
+from drafter.display_list import DisplayList, FILL, PUSH, POP
+
+RED = (1, 0, 0, 1)
+BLUE = (0, 0, 1, 1)
+HALF_RED = (1, 0, 0, 0.5)
+
+
+class RecordingContext:
+    """
+    Stands for a cairo context and records the calls made on it.
+    """
+    def __init__(self):
+        self.calls = []
+
+    def __getattr__(self, name):
+        def record(*args):
+            self.calls.append((name,) + args)
+        return record
+
+
+def play(display_list):
+    display_list.optimize()
+    ctx = RecordingContext()
+    display_list.play(ctx)
+    return ctx.calls
+
+
+def fills(display_list):
+    """
+    (color, rectangles) of the fills left after optimizing.
+    """
+    display_list.optimize()
+    return [(op[1], op[2]) for op in display_list.ops if op[0] == FILL]
+
+
+def test_fills_of_one_color_are_batched():
+    display_list = DisplayList(None)
+    display_list.fill(0, 0, 10, 10, RED)
+    display_list.fill(20, 0, 10, 10, RED)
+    assert play(display_list) == [
+        ('rectangle', 0, 0, 10, 10),
+        ('rectangle', 20, 0, 10, 10),
+        ('set_source_rgba',) + RED,
+        ('fill',),
+    ]
+
+
+def test_batching_keeps_the_order_of_overlapping_fills():
+    display_list = DisplayList(None)
+    display_list.fill(0, 0, 10, 10, RED)
+    display_list.fill(5, 5, 10, 10, BLUE)
+    # Over the blue fill, so it can not join the first red one.
+    display_list.fill(8, 8, 10, 10, RED)
+    assert fills(display_list) == [
+        (RED, [(0, 0, 10, 10)]),
+        (BLUE, [(5, 5, 10, 10)]),
+        (RED, [(8, 8, 10, 10)]),
+    ]
+
+
+def test_batching_moves_fills_over_what_they_do_not_overlap():
+    display_list = DisplayList(None)
+    display_list.fill(0, 0, 10, 10, RED)
+    display_list.fill(5, 5, 10, 10, BLUE)
+    display_list.fill(40, 40, 10, 10, RED)
+    assert fills(display_list) == [
+        (RED, [(0, 0, 10, 10), (40, 40, 10, 10)]),
+        (BLUE, [(5, 5, 10, 10)]),
+    ]
+
+
+def test_overlapping_translucent_fills_are_not_batched():
+    display_list = DisplayList(None)
+    display_list.fill(0, 0, 10, 10, HALF_RED)
+    display_list.fill(5, 5, 10, 10, HALF_RED)
+    display_list.fill(40, 40, 10, 10, HALF_RED)
+    assert fills(display_list) == [
+        (HALF_RED, [(0, 0, 10, 10)]),
+        (HALF_RED, [(5, 5, 10, 10), (40, 40, 10, 10)]),
+    ]
+
+
+def test_fills_covered_by_a_later_opaque_fill_are_removed():
+    display_list = DisplayList(None)
+    display_list.fill(10, 10, 10, 10, BLUE)
+    display_list.fill(0, 0, 50, 50, RED)
+    assert fills(display_list) == [(RED, [(0, 0, 50, 50)])]
+
+
+def test_fills_covered_by_a_translucent_fill_are_kept():
+    display_list = DisplayList(None)
+    display_list.fill(10, 10, 10, 10, BLUE)
+    display_list.fill(0, 0, 50, 50, HALF_RED)
+    assert fills(display_list) == [
+        (BLUE, [(10, 10, 10, 10)]),
+        (HALF_RED, [(0, 0, 50, 50)]),
+    ]
+
+
+def test_fills_are_not_covered_from_another_coordinate_space():
+    display_list = DisplayList(None)
+    display_list.fill(10, 10, 10, 10, BLUE)
+    display_list.push('scale')
+    # Covers the blue fill in its own coordinates only.
+    display_list.fill(0, 0, 50, 50, RED)
+    display_list.pop()
+    assert fills(display_list) == [
+        (BLUE, [(10, 10, 10, 10)]),
+        (RED, [(0, 0, 50, 50)]),
+    ]
+
+
+def test_fills_are_not_batched_across_transforms():
+    display_list = DisplayList(None)
+    display_list.fill(0, 0, 10, 10, RED)
+    display_list.push('scale')
+    display_list.fill(20, 0, 10, 10, RED)
+    display_list.pop()
+    display_list.fill(40, 0, 10, 10, RED)
+    display_list.optimize()
+    assert [op[0] for op in display_list.ops] == [
+        FILL, PUSH, FILL, POP, FILL,
+    ]
+
+
+def test_playing_a_transform_restores_the_state():
+    display_list = DisplayList(None)
+    display_list.fill(0, 0, 10, 10, RED)
+    display_list.push('scale')
+    display_list.fill(20, 0, 10, 10, BLUE)
+    display_list.pop()
+    display_list.fill(40, 0, 10, 10, RED)
+    # The color set before the transform is current again after it.
+    assert play(display_list) == [
+        ('rectangle', 0, 0, 10, 10),
+        ('set_source_rgba',) + RED,
+        ('fill',),
+        ('save',),
+        ('transform', 'scale'),
+        ('rectangle', 20, 0, 10, 10),
+        ('set_source_rgba',) + BLUE,
+        ('fill',),
+        ('restore',),
+        ('rectangle', 40, 0, 10, 10),
+        ('fill',),
+    ]
+
+
+def test_calls_are_made_on_a_saved_context():
+    display_list = DisplayList(None)
+    display_list.call(lambda ctx: ctx.paint(), (0, 0, 10, 10))
+    assert play(display_list) == [
+        ('save',), ('paint',), ('restore',), ('new_path',),
+    ]
@@ -0,0 +1,78 @@
+import io
+import struct
+import sys
+import zlib
+
+import numpy as np
+import pytest
+
+from drafter.utils.png import PNG_SIGNATURE, PngWriter, chunk, unpremultiply
+
+
+def argb(rgba):
+    """
+    ARGB32 pixels, as cairo stores them, of premultiplied (r, g, b, a)
+    rows.
+    """
+    rgba = np.array(rgba, dtype=np.uint8)
+    order = [2, 1, 0, 3] if sys.byteorder == 'little' else [3, 0, 1, 2]
+    return rgba[..., order]
+
+
+def read_chunks(data):
+    assert data[:8] == PNG_SIGNATURE
+    chunks = []
+    pos = 8
+    while pos < len(data):
+        length, = struct.unpack('>I', data[pos:pos + 4])
+        tag = data[pos + 4:pos + 8]
+        body = data[pos + 8:pos + 8 + length]
+        crc, = struct.unpack('>I', data[pos + 8 + length:pos + 12 + length])
+        assert crc == zlib.crc32(tag + body)
+        chunks.append((tag, body))
+        pos += 12 + length
+    return chunks
+
+
+def test_chunk():
+    data = chunk(b'IEND', b'')
+    assert data == b'\0\0\0\0IEND' + struct.pack('>I', zlib.crc32(b'IEND'))
+
+
+def test_unpremultiply():
+    pixels = argb([[[100, 50, 0, 200], [10, 20, 30, 0], [1, 2, 3, 255]]])
+    assert unpremultiply(pixels).tolist() == [[
+        [128, 64, 0, 200], [0, 0, 0, 0], [1, 2, 3, 255],
+    ]]
+
+
+def test_png_writer_writes_bands():
+    rows = [
+        [[255, 0, 0, 255], [0, 0, 0, 0]],
+        [[0, 128, 0, 128], [0, 0, 255, 255]],
+        [[10, 20, 30, 255], [40, 50, 60, 255]],
+    ]
+    stream = io.BytesIO()
+    with PngWriter(stream, 2, 3) as png:
+        png.write_pixels(argb(rows[:2]))
+        png.write_pixels(argb(rows[2:]))
+
+    chunks = read_chunks(stream.getvalue())
+    assert chunks[0] == (
+        b'IHDR', struct.pack('>IIBBBBB', 2, 3, 8, 6, 0, 0, 0)
+    )
+    assert chunks[-1] == (b'IEND', b'')
+    data = zlib.decompress(b''.join(
+        body for tag, body in chunks if tag == b'IDAT'
+    ))
+    expected = unpremultiply(argb(rows)).reshape(3, 8)
+    assert data == b''.join(b'\0' + row.tobytes() for row in expected)
+
+
+def test_png_writer_checks_the_rows():
+    png = PngWriter(io.BytesIO(), 2, 2)
+    with pytest.raises(Exception):
+        png.write_pixels(argb([[[0, 0, 0, 0]] * 3]))
+    png.write_pixels(argb([[[0, 0, 0, 0]] * 2]))
+    with pytest.raises(Exception):
+        png.close()